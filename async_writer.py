@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+u"""
+Write-behind output stage.
+
+Output files are written by a dedicated I/O thread fed by a bounded
+queue, so that compression and disk writes of a track/batch overlap
+with the computation of the next one. pyogrio and Arrow release the GIL
+while encoding and writing, and the wall time approaches
+max(compute, I/O) instead of their sum.
+
+    - Back-pressure: AsyncWriter.submit blocks when max_pending writes
+      are already queued, bounding the memory held by pending outputs.
+    - Error propagation: the first error raised by a write is re-raised
+      in the submitting thread by the next call to submit or close.
+      Writes queued after a failure are skipped.
+
+ChunkedOutput writes a sequence of GeoDataFrame chunks to a single
+GeoParquet (Arrow ParquetWriter) or OGR (pyogrio append) file. The file
+is written to a temporary path and moved over the destination on close.
+If a write fails, abort closes the file and removes the temporary path.
+
+Python Dependencies
+geopandas: Open source project to make working with geospatial data
+    in python easier: https://geopandas.org
+pyarrow: Python library for Apache Arrow:
+    https://arrow.apache.org/docs/python/
+pyogrio: Vectorized spatial vector file format I/O using GDAL/OGR:
+    https://pyogrio.readthedocs.io
+"""
+import io
+import os
+import json
+import queue
+import threading
+from typing import Callable
+import geopandas as gpd
+import pyogrio
+import pyarrow as pa
+import pyarrow.parquet as pq
+try:
+    # - Private geopandas API: GeoParquet table without file I/O
+    from geopandas.io.arrow import _geopandas_to_arrow
+except ImportError:
+    _geopandas_to_arrow = None
+
+# - Shapefile sidecar files
+SHP_SIDECARS = ('.shp', '.shx', '.dbf', '.prj', '.cpg')
+
+
+def geoparquet_table(gdf: gpd.GeoDataFrame,
+                     write_covering_bbox: bool = False) -> pa.Table:
+    """
+    Convert a GeoDataFrame to an Arrow table with the GeoParquet
+    metadata (the index is not included).
+    The conversion relies on a private geopandas function. If it is not
+    available, the table is obtained with the public to_parquet writer
+    through an in-memory buffer.
+    """
+    if _geopandas_to_arrow is not None:
+        try:
+            return _geopandas_to_arrow(
+                gdf, index=False, write_covering_bbox=write_covering_bbox)
+        except TypeError:
+            # - Signature changed: use the public writer
+            pass
+    buffer = io.BytesIO()
+    gdf.to_parquet(buffer, index=False, compression=None,
+                   write_covering_bbox=write_covering_bbox)
+    buffer.seek(0)
+    return pq.read_table(buffer)
+
+
+class AsyncWriter:
+    """
+    Run write operations on a dedicated I/O thread.
+    Use as a context manager:
+
+        with AsyncWriter(max_pending=2) as writer:
+            for gdf in batches():
+                writer.submit(gdf.to_file, out_file)
+    """
+    def __init__(self, max_pending: int = 2) -> None:
+        if max_pending < 1:
+            raise ValueError("max_pending must be >= 1.")
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._worker,
+                                        name='AsyncWriter', daemon=True)
+        self._thread.start()
+
+    def _worker(self) -> None:
+        """I/O thread: execute the queued writes in order."""
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if self._error is None:
+                    func, args, kwargs = item
+                    func(*args, **kwargs)
+            except BaseException as err:
+                self._error = err
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise RuntimeError("Asynchronous write failed.") \
+                from self._error
+
+    def submit(self, func: Callable, *args, **kwargs) -> None:
+        """
+        Queue a write operation: func(*args, **kwargs).
+        Blocks while max_pending writes are waiting.
+        """
+        if self._closed:
+            raise RuntimeError("AsyncWriter is closed.")
+        self._raise_error()
+        self._queue.put((func, args, kwargs))
+
+    def flush(self) -> None:
+        """Wait for the queued writes to complete."""
+        self._queue.join()
+        self._raise_error()
+
+    def close(self) -> None:
+        """Wait for the queued writes and stop the I/O thread."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_error()
+
+    def __enter__(self) -> 'AsyncWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+            return
+        # - Do not mask the exception raised in the with block
+        try:
+            self.close()
+        except RuntimeError:
+            pass
+
+
+class ChunkedOutput:
+    """
+    Write a sequence of GeoDataFrame chunks sharing the same schema
+    to a single file: GeoParquet for the .parquet extension, any OGR
+    format (e.g. ESRI shapefile) otherwise. The index is not written.
+    GeoParquet options:
+        compression: Parquet compression codec.
+        row_group_size: maximum number of rows per row group.
+        write_covering_bbox: add the per-row bounding box column
+            (GeoParquet 1.1 covering) used by readers to skip row groups.
+    Use as a context manager to remove the temporary file if a write
+    fails:
+
+        with ChunkedOutput(out_file) as output:
+            for gdf in chunks():
+                output.write(gdf)
+    """
+    def __init__(self, out_file: str, compression: str = 'snappy',
+                 row_group_size: int | None = None,
+                 write_covering_bbox: bool = False) -> None:
+        self.out_file = out_file
+        self.compression = compression
+        self.row_group_size = row_group_size
+        self.write_covering_bbox = write_covering_bbox
+        base, ext = os.path.splitext(out_file)
+        self._tmp_file = f"{base}_tmp{ext}"
+        self._parquet = ext == '.parquet'
+        self._writer = None
+        self._schema = None
+        self.n_rows = 0
+
+    def write(self, gdf: gpd.GeoDataFrame) -> None:
+        """Append a chunk to the output file."""
+        if self._parquet:
+            table = geoparquet_table(
+                gdf, write_covering_bbox=self.write_covering_bbox)
+            if self._writer is None:
+                # - Bounding box of the first chunk only: drop it
+                # - from the GeoParquet metadata (optional field).
+                metadata = dict(table.schema.metadata)
+                geo = json.loads(metadata[b'geo'])
+                for col_meta in geo['columns'].values():
+                    col_meta.pop('bbox', None)
+                metadata[b'geo'] = json.dumps(geo).encode('utf-8')
+                self._schema = table.schema.with_metadata(metadata)
+                self._writer = pq.ParquetWriter(
+                    self._tmp_file, self._schema,
+                    compression=self.compression)
+            self._writer.write_table(table.cast(self._schema),
+                                     row_group_size=self.row_group_size)
+        else:
+            pyogrio.write_dataframe(gdf.reset_index(drop=True),
+                                    self._tmp_file, append=self.n_rows > 0)
+        self.n_rows += len(gdf)
+
+    def close(self) -> None:
+        """Finalize the output file and move it to its destination."""
+        if self._parquet:
+            if self._writer is None:
+                return
+            self._writer.close()
+            self._writer = None
+            os.replace(self._tmp_file, self.out_file)
+        else:
+            replace_file(self._tmp_file, self.out_file)
+
+    def abort(self) -> None:
+        """
+        Discard a partially written output: close the file and
+        remove the temporary path. The destination is left untouched.
+        """
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except Exception:       # - the file is removed anyway
+                pass
+            self._writer = None
+        remove_file(self._tmp_file)
+
+    def __enter__(self) -> 'ChunkedOutput':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def replace_file(src_file: str, dst_file: str) -> None:
+    """
+    Move a file over another one. A shapefile is made of several
+    sidecar files, moved one by one.
+    """
+    src_base, ext = os.path.splitext(src_file)
+    if ext != '.shp':
+        if os.path.isfile(src_file):
+            os.replace(src_file, dst_file)
+        return
+    dst_base = os.path.splitext(dst_file)[0]
+    for sfx in SHP_SIDECARS:
+        if os.path.isfile(src_base + sfx):
+            os.replace(src_base + sfx, dst_base + sfx)
+
+
+def remove_file(out_file: str) -> None:
+    """
+    Remove a file if it exists. A shapefile is removed together with
+    its sidecar files.
+    """
+    base, ext = os.path.splitext(out_file)
+    for f_name in ([base + sfx for sfx in SHP_SIDECARS] if ext == '.shp'
+                   else [out_file]):
+        if os.path.isfile(f_name):
+            os.remove(f_name)
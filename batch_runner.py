@@ -0,0 +1,433 @@
+#!/usr/bin/env python
+u"""
+Resumable batch processing of the MapItaly tracks and of a set of AOIs
+described by a YAML run specification.
+
+The run specification is expanded into a set of tasks:
+    1. one grid task for each MapItaly track;
+    2. one PS distribution task for each (track, AOI) pair whose
+       bounding boxes intersect.
+Tasks are executed serially, on a local process pool or on a dask
+LocalCluster. A checkpoint file is written atomically when a task
+completes. When the same specification is run again, tasks with a valid
+checkpoint (same parameters, same input content, outputs still on disk)
+are skipped.
+
+Run specification example:
+
+    frames_file: MAPITALY_CSG1_2_CSK1_2.shp
+    out_dir: national_run
+    out_format: parquet             # parquet or shp
+    grid:
+      n_c: 3
+      az_res: 5000.
+      buffer_dist: 5000.
+    tracks: all                     # or a list of Path values
+    aois:
+      - name: NOC_A
+        ps_file: csk_ps_sample_Nocera_Terinese_A_epsg4326.shp
+        tracks: [151]               # optional
+    executor:
+      type: process                 # serial, process or dask
+      workers: 4
+
+Relative paths are resolved with respect to the specification file.
+
+usage: batch_runner.py [-h] run_spec
+
+positional arguments:
+  run_spec              YAML run specification.
+
+Python Dependencies
+pyyaml: YAML parser and emitter for Python: https://pyyaml.org
+geopandas: Open source project to make working with geospatial data
+    in python easier: https://geopandas.org
+pyogrio: Vectorized vector I/O using OGR: https://pyogrio.readthedocs.io
+dask.distributed (optional): Distributed computing with Dask:
+    https://distributed.dask.org
+"""
+import os
+import json
+import hashlib
+import argparse
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, Future, as_completed
+import yaml
+import pyogrio
+# - Custom Dependencies
+from rm_z_coord import rm_z_coord
+from read_cached import read_cached, source_fingerprint
+from generate_grid import generate_grid
+from mapitaly_at_grid import track_parameters
+from mapitaly_pipeline import assign_ps_grids
+from distribute_ps_grid import save_ps_output
+from async_writer import replace_file
+
+# - Default grid parameters
+GRID_DEFAULTS = {'n_c': 3, 'az_res': 5e3, 'buffer_dist': 5e3}
+
+
+def load_run_spec(spec_file: str) -> dict:
+    """
+    Load and validate a YAML run specification.
+    Args:
+        spec_file: Absolute Path to the YAML file.
+    Returns: dictionary containing the run specification with
+        default values filled in and absolute paths.
+    """
+    if not os.path.isfile(spec_file):
+        raise FileNotFoundError(f"File not found: {spec_file}")
+    with open(spec_file, encoding='utf-8') as f_in:
+        spec = yaml.safe_load(f_in) or {}
+    spec_dir = os.path.dirname(os.path.abspath(spec_file))
+
+    def abs_path(path: str) -> str:
+        return os.path.normpath(os.path.join(spec_dir,
+                                             os.path.expanduser(path)))
+
+    for key in ('frames_file', 'out_dir'):
+        if key not in spec:
+            raise ValueError(f"Run specification: missing '{key}'.")
+        spec[key] = abs_path(spec[key])
+    spec['grid'] = {**GRID_DEFAULTS, **(spec.get('grid') or {})}
+    spec.setdefault('out_format', 'parquet')
+    if spec['out_format'] not in ('parquet', 'shp'):
+        raise ValueError("Run specification: out_format must be "
+                         "'parquet' or 'shp'.")
+    spec.setdefault('tracks', 'all')
+    spec['aois'] = spec.get('aois') or []
+    for aoi in spec['aois']:
+        if 'name' not in aoi or 'ps_file' not in aoi:
+            raise ValueError("Run specification: each AOI requires "
+                             "'name' and 'ps_file'.")
+        aoi['ps_file'] = abs_path(aoi['ps_file'])
+    spec['executor'] = {'type': 'process', 'workers': os.cpu_count(),
+                        **(spec.get('executor') or {})}
+    if spec['executor']['type'] not in ('serial', 'process', 'dask'):
+        raise ValueError("Run specification: executor type must be "
+                         "'serial', 'process' or 'dask'.")
+    spec.setdefault('checkpoint_dir',
+                    os.path.join(spec['out_dir'], '.checkpoints'))
+    spec['checkpoint_dir'] = abs_path(spec['checkpoint_dir'])
+    return spec
+
+
+def _select_tracks(path_list: list, tracks) -> list:
+    """Select a subset of 'Path' values. Values are compared as strings."""
+    if tracks in (None, 'all'):
+        return path_list
+    tracks = {str(t) for t in tracks}
+    return [p for p in path_list if str(p) in tracks]
+
+
+def _task_key(params: dict) -> str:
+    """Return a hash identifying the parameters of a task."""
+    return hashlib.sha256(json.dumps(params, sort_keys=True, default=str)
+                          .encode('utf-8')).hexdigest()
+
+
+def _content_key(path: str) -> dict:
+    """
+    Identify the content of an input data source (size and SHA-256 hash
+    of its files, see read_cached.source_fingerprint). Modification
+    times are ignored: a touched but unchanged input keeps its tasks.
+    """
+    return {f_name: (f_ref['size'], f_ref['sha256'])
+            for f_name, f_ref in source_fingerprint(path).items()}
+
+
+def _write_checkpoint(ckpt_file: str, data: dict) -> None:
+    """Atomically write a task checkpoint."""
+    tmp_file = ckpt_file + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f_out:
+        json.dump(data, f_out, indent=2)
+    os.replace(tmp_file, ckpt_file)
+
+
+def is_completed(task: dict, checkpoint_dir: str) -> bool:
+    """
+    Check whether a task has a valid checkpoint.
+    Args:
+        task: task dictionary: id, func, kwargs, params (task parameters
+            identifying its result) and outputs.
+        checkpoint_dir: checkpoints directory.
+    Returns: True if the checkpoint exists, refers to the same task
+        parameters and all the task outputs exist.
+    """
+    ckpt_file = os.path.join(checkpoint_dir, f"{task['id']}.json")
+    if not os.path.isfile(ckpt_file):
+        return False
+    with open(ckpt_file, encoding='utf-8') as f_in:
+        ckpt = json.load(f_in)
+    return (ckpt.get('key') == _task_key(task['params'])
+            and all(os.path.isfile(f) for f in task['outputs']))
+
+
+def grid_task(frames_file: str, path, n_c: int, az_res: float,
+              buffer_dist: float, out_file: str) -> str:
+    """
+    Generate the along-track grid of a single MapItaly track.
+    Args:
+        frames_file: Absolute Path to the MapItaly frames file.
+        path: track 'Path' value.
+        n_c: number of columns of the output grid
+        az_res: grid azimuth resolution (m)
+        buffer_dist: grid buffer distance (m)
+        out_file: Absolute Path to the output grid shapefile.
+    Returns: Absolute Path to the output grid shapefile.
+    """
+    gdf = read_cached(frames_file)
+    p_gdf = rm_z_coord(gdf[gdf['Path'] == path].reset_index(drop=True))
+    gdf_grid = generate_grid(p_gdf.copy(), n_c=n_c, az_res=az_res,
+                             buffer_dist=buffer_dist)
+    # - Atomic write: an interrupted task never leaves a partial grid
+    base, ext = os.path.splitext(out_file)
+    tmp_file = f"{base}_tmp{ext}"
+    gdf_grid.to_file(tmp_file)
+    replace_file(tmp_file, out_file)
+    return out_file
+
+
+def ps_task(ps_file: str, grid_file: str, out_file: str) -> str:
+    """
+    Distribute the PS points of an AOI over a track grid.
+    Args:
+        ps_file: Absolute Path to the PS input file.
+        grid_file: Absolute Path to the track grid file.
+        out_file: Absolute Path to the output file.
+    Returns: Absolute Path to the output file.
+    """
+    gdf_smp = assign_ps_grids(read_cached(ps_file), read_cached(grid_file))
+    save_ps_output(gdf_smp, out_file)
+    return out_file
+
+
+def expand_grid_tasks(spec: dict) -> list[dict]:
+    """
+    Expand the run specification into one grid task per track.
+    Args:
+        spec: run specification (see load_run_spec).
+    Returns: list of task dictionaries.
+    """
+    gdf = read_cached(spec['frames_file'],
+                      columns=['Path', 'SensorMode', 'Pass', 'Satellite'])
+    grid_dir = os.path.join(spec['out_dir'], 'grids')
+    # - A new frames file invalidates the grids
+    frames_key = _content_key(spec['frames_file'])
+    tasks = []
+    for p in _select_tracks(gdf['Path'].unique().tolist(), spec['tracks']):
+        t_par = track_parameters(gdf[gdf['Path'] == p])
+        grid_name = (f"grid_{t_par['sat_short']}_{p}_{t_par['s_mode']}_"
+                     f"{t_par['pass_geom']}")
+        out_file = os.path.join(grid_dir, f"{grid_name}.shp")
+        kwargs = {'frames_file': spec['frames_file'], 'path': p,
+                  **spec['grid'], 'out_file': out_file}
+        tasks.append({'id': grid_name, 'path': p, 'func': grid_task,
+                      'kwargs': kwargs,
+                      'params': {**kwargs, 'frames': frames_key},
+                      'outputs': [out_file]})
+    return tasks
+
+
+def expand_ps_tasks(spec: dict, grid_tasks: list[dict]) -> list[dict]:
+    """
+    Expand the run specification into one PS distribution task for
+    each (track, AOI) pair. Pairs whose bounding boxes do not
+    intersect are discarded. Only the grids whose task completed with
+    the current parameters (valid checkpoint) are used: a grid file
+    left by a previous run with other parameters is ignored.
+    Args:
+        spec: run specification (see load_run_spec).
+        grid_tasks: grid tasks returned by expand_grid_tasks.
+    Returns: list of task dictionaries.
+    """
+    tasks = []
+    for aoi in spec['aois']:
+        ps_bounds = pyogrio.read_info(aoi['ps_file'])['total_bounds']
+        ps_key = None
+        aoi_tracks = _select_tracks([t['path'] for t in grid_tasks],
+                                    aoi.get('tracks', 'all'))
+        for g_task in grid_tasks:
+            grid_file = g_task['outputs'][0]
+            if g_task['path'] not in aoi_tracks \
+                    or not is_completed(g_task, spec['checkpoint_dir']):
+                continue
+            g_bounds = pyogrio.read_info(grid_file)['total_bounds']
+            if (g_bounds[0] > ps_bounds[2] or g_bounds[2] < ps_bounds[0]
+                    or g_bounds[1] > ps_bounds[3]
+                    or g_bounds[3] < ps_bounds[1]):
+                continue
+            out_file = os.path.join(
+                spec['out_dir'], aoi['name'],
+                os.path.splitext(os.path.basename(aoi['ps_file']))[0]
+                + f"_{g_task['id']}_rc.{spec['out_format']}")
+            kwargs = {'ps_file': aoi['ps_file'], 'grid_file': grid_file,
+                      'out_file': out_file}
+            # - A new grid or new PS points invalidate the distribution
+            if ps_key is None:
+                ps_key = _content_key(aoi['ps_file'])
+            params = {**kwargs, 'grid': _task_key(g_task['params']),
+                      'ps': ps_key}
+            tasks.append({'id': f"{aoi['name']}_{g_task['id']}",
+                          'func': ps_task, 'kwargs': kwargs,
+                          'params': params, 'outputs': [out_file]})
+    return tasks
+
+
+class _SerialExecutor:
+    """Run tasks in the calling process (debugging, small runs)."""
+    def submit(self, func, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(func(*args, **kwargs))
+        except Exception as err:     # - reported by run_tasks
+            future.set_exception(err)
+        return future
+
+    def shutdown(self) -> None:
+        pass
+
+
+def _get_executor(executor: dict):
+    """
+    Return (executor, as_completed) for the executor specification.
+    """
+    if executor['type'] == 'serial':
+        return _SerialExecutor(), as_completed
+    if executor['type'] == 'process':
+        return ProcessPoolExecutor(max_workers=executor['workers']), \
+            as_completed
+    try:
+        from dask.distributed import Client, LocalCluster
+        from dask.distributed import as_completed as dask_as_completed
+    except ImportError as err:
+        raise ImportError("The dask executor requires dask.distributed."
+                          ) from err
+    cluster = LocalCluster(n_workers=executor['workers'],
+                           threads_per_worker=1, processes=True)
+    client = Client(cluster)
+
+    class _DaskExecutor:
+        def submit(self, func, *args, **kwargs):
+            return client.submit(func, *args, pure=False, **kwargs)
+
+        def shutdown(self) -> None:
+            client.close()
+            cluster.close()
+    return _DaskExecutor(), dask_as_completed
+
+
+def run_tasks(tasks: list[dict], spec: dict) -> dict:
+    """
+    Run a list of tasks, skipping those already completed.
+    Args:
+        tasks: list of task dictionaries.
+        spec: run specification (see load_run_spec).
+    Returns: dictionary with the ids of the 'done', 'skipped'
+        and 'failed' tasks.
+    """
+    checkpoint_dir = spec['checkpoint_dir']
+    os.makedirs(checkpoint_dir, exist_ok=True)
+    status = {'done': [], 'skipped': [], 'failed': []}
+    pending = []
+    for task in tasks:
+        if is_completed(task, checkpoint_dir):
+            status['skipped'].append(task['id'])
+        else:
+            for out_file in task['outputs']:
+                os.makedirs(os.path.dirname(out_file), exist_ok=True)
+            pending.append(task)
+    if not pending:
+        return status
+
+    executor, completed = _get_executor(spec['executor'])
+    try:
+        futures = {executor.submit(task['func'], **task['kwargs']): task
+                   for task in pending}
+        for future in completed(futures):
+            task = futures[future]
+            try:
+                future.result()
+            except Exception as err:    # - failed tasks do not stop the run
+                print(f"# - Task {task['id']} failed: {err!r}")
+                status['failed'].append(task['id'])
+                continue
+            _write_checkpoint(
+                os.path.join(checkpoint_dir, f"{task['id']}.json"),
+                {'task': task['id'], 'key': _task_key(task['params']),
+                 'outputs': task['outputs'],
+                 'completed': datetime.now().isoformat()})
+            status['done'].append(task['id'])
+    finally:
+        executor.shutdown()
+    return status
+
+
+def run_batch(spec_file: str) -> dict:
+    """
+    Run all the tasks described by a YAML run specification.
+    Args:
+        spec_file: Absolute Path to the YAML run specification.
+    Returns: dictionary with the ids of the 'done', 'skipped'
+        and 'failed' tasks.
+    """
+    spec = load_run_spec(spec_file)
+    os.makedirs(spec['out_dir'], exist_ok=True)
+    # - Build the input caches once, before the workers start
+    read_cached(spec['frames_file'], columns=[])
+    for aoi in spec['aois']:
+        read_cached(aoi['ps_file'], columns=[])
+
+    grid_tasks = expand_grid_tasks(spec)
+    print(f"# - Grid tasks: {len(grid_tasks)}")
+    status = run_tasks(grid_tasks, spec)
+    ps_tasks = expand_ps_tasks(spec, grid_tasks)
+    print(f"# - PS distribution tasks: {len(ps_tasks)}")
+    ps_status = run_tasks(ps_tasks, spec)
+    for key, value in ps_status.items():
+        status[key] += value
+    print(f"# - Tasks completed: {len(status['done'])}, "
+          f"skipped: {len(status['skipped'])}, "
+          f"failed: {len(status['failed'])}")
+    return status
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Add the command line arguments of batch_runner to a parser.
+    """
+    parser.add_argument('run_spec', type=str,
+                        help='YAML run specification.')
+
+
+def run(args: argparse.Namespace) -> None:
+    """
+    Run the batch described by the command line arguments.
+    Args:
+        args: parsed command line arguments. See add_arguments.
+    """
+    status = run_batch(args.run_spec)
+    if status['failed']:
+        raise SystemExit(f"# - Failed tasks: {', '.join(status['failed'])}. "
+                         f"Run again to resume.")
+
+
+def main() -> None:
+    """
+    Resumable batch processing of the MapItaly tracks and of a set
+    of AOIs described by a YAML run specification.
+    """
+    parser = argparse.ArgumentParser(
+        description="""Run the MapItaly grid generation and the PS
+        distribution described by a YAML run specification."""
+    )
+    add_arguments(parser)
+    run(parser.parse_args())
+
+
+# - run main program
+if __name__ == '__main__':
+    start_time = datetime.now()
+    main()
+    end_time = datetime.now()
+    print(f"# - Computation Time: {end_time - start_time}")
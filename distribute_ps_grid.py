@@ -5,7 +5,9 @@ Use a Spatial Join to distribute the PS points available within
 the boundaries of a CSK frame over the relative along-track grid.
 
 usage: distribute_ps_grid.py [-h] [--out_dir OUT_DIR]
-    [--out_format {parquet,shp}] [--plot] input_file grid_file
+    [--out_format {parquet,shp,cube}] [--previous PREVIOUS] [--id_col ID_COL]
+    [--plot] [--batch_size BATCH_SIZE] [--max_pending MAX_PENDING]
+    input_file grid_file
 
 Distribute PS points over the CSK grid
 
@@ -17,43 +19,87 @@ options:
   -h, --help            show this help message and exit
   --out_dir OUT_DIR, -O OUT_DIR
                         Output directory.
-  --out_format {parquet,shp}, -F {parquet,shp}
-                        Output file format.
+  --out_format {parquet,shp,cube}, -F {parquet,shp,cube}
+                        Output file format. cube: displacement time-series
+                        cube (see ps_cube.py).
+  --previous PREVIOUS, -U PREVIOUS
+                        Previous _rc output. Only new or moved PS points are
+                        re-assigned with a Spatial Join. The whole output is
+                        rewritten.
+  --id_col ID_COL       PS unique identifier column [def. id].
   --plot, -P            Plot the results showing the PS partition.
+  --batch_size BATCH_SIZE
+                        Number of partitions computed together [def. number
+                        of CPUs].
+  --max_pending MAX_PENDING
+                        Maximum number of batches waiting to be written
+                        [def. 2].
 
 Python Dependencies
 geopandas: Open source project to make working with geospatial data
     in python easier: https://geopandas.org
 dask-geopandas: Distributed geospatial operations using Dask:
     https://dask-geopandas.readthedocs.io
+pyarrow: Python library for Apache Arrow:
+    https://arrow.apache.org/docs/python/
+pyogrio: Vectorized spatial vector file format I/O using GDAL/OGR:
+    https://pyogrio.readthedocs.io
 matplotlib: Comprehensive library for creating static, animated, and
     interactive visualizations in Python: https://matplotlib.org
 """
 import os
+import shutil
 import argparse
 from datetime import datetime
+import numpy as np
+import pandas as pd
 import geopandas as gpd
-import dask_geopandas as dgpd
-import matplotlib.pyplot as plt
+import pyogrio
+import pyarrow.parquet as pq
+from read_cached import read_cached, cached_parquet
+from async_writer import AsyncWriter, ChunkedOutput, replace_file
 
+# - Columns not needed in the output
+DROP_COLUMNS = ['index_right', 'type', 'rand_point',
+                'index', 'name',  'csm_path']
+# - GeoParquet output: rows per row group
+ROW_GROUP_SIZE = 100_000
 
-def distribute_ps_grid(input_file: str, grid_file: str) -> gpd.GeoDataFrame:
+
+def distribute_ps_grid(input_file: str, grid_file: str,
+                       npartitions: int = 4) -> gpd.GeoDataFrame:
     """
     Use a Spatial Join to distribute the PS points available within
     Args:
         input_file: Absolute Path to the input file.
         grid_file: Absolute Path to the grid file.
+        npartitions: minimum number of Dask partitions. The GeoParquet
+            cache of the input file is loaded with one partition per
+            row group (see read_cached.ROW_GROUP_SIZE).
     Returns: None
     """
     if not os.path.isfile(input_file):
         raise FileNotFoundError(f"File not found: {input_file}")
-    # - Import PS Sample Data
-    gdf_smp = dgpd.read_file(input_file, npartitions=4)
+    # - Dask is only needed by the full (non incremental) join
+    import dask_geopandas as dgpd
+    # - Import PS Sample Data - GeoParquet cache of the input file
+    try:
+        gdf_smp = dgpd.read_parquet(cached_parquet(input_file),
+                                    split_row_groups=True)
+        # - The spatial partitions read from the GeoParquet metadata
+        # - cover the whole file: drop them.
+        gdf_smp.spatial_partitions = None
+    except OSError as err:
+        # - Cache not available (e.g. read-only file system)
+        print(f"# - Cache not available ({err}). Reading: {input_file}")
+        gdf_smp = dgpd.read_file(input_file, npartitions=npartitions)
+    if gdf_smp.npartitions < npartitions:
+        gdf_smp = gdf_smp.repartition(npartitions=npartitions)
 
     # - Import CSK AlongTrack Grid
     if not os.path.isfile(grid_file):
         raise FileNotFoundError(f"File not found: {grid_file}")
-    gdf_csk = gpd.read_file(grid_file)
+    gdf_csk = read_cached(grid_file)
 
     # - Print input/output file names
     print(f"# - Input PS Sample: {input_file}")
@@ -66,15 +112,276 @@ def distribute_ps_grid(input_file: str, grid_file: str) -> gpd.GeoDataFrame:
     return gdf_smp
 
 
-def main() -> None:
+def read_ps_output(out_file: str, bbox: tuple | None = None,
+                   cell: tuple[int, int] | None = None,
+                   columns: list[str] | None = None) -> gpd.GeoDataFrame:
     """
-    Use a Spatial Join to distribute the PS points available within
-    the boundaries of a CSK frame over the relative along-track grid.
+    Read a PS partition previously saved by distribute_ps_grid.
+    GeoParquet outputs are sorted by grid cell and store the bounding box
+    and the row/col statistics of each row group: bbox and cell filtered
+    reads skip the row groups outside the selection.
+    Args:
+        out_file: Absolute Path to the _rc output file (parquet or shp).
+        bbox: (xmin, ymin, xmax, ymax) - read only the points
+            intersecting this bounding box.
+        cell: (row, col) - read only the points of this grid cell.
+        columns: subset of attribute columns to read. The geometry
+            column is always read.
+    Returns: gpd.GeoDataFrame
+    """
+    if not os.path.isfile(out_file):
+        raise FileNotFoundError(f"File not found: {out_file}")
+    if columns is not None:
+        columns = [c for c in columns if c != 'geometry'] + ['geometry']
+    if out_file.endswith('.parquet'):
+        filters = None if cell is None \
+            else [('row', '==', cell[0]), ('col', '==', cell[1])]
+        gdf_smp = gpd.read_parquet(out_file, bbox=bbox, filters=filters,
+                                   columns=columns)
+        return gdf_smp.drop(columns='bbox', errors='ignore')
+    gdf_smp = gpd.read_file(out_file, bbox=bbox, columns=columns)
+    if cell is not None:
+        gdf_smp = gdf_smp[(gdf_smp['row'] == cell[0])
+                          & (gdf_smp['col'] == cell[1])]
+    return gdf_smp
+
+
+def sort_ps_spatially(gdf_smp, total_bounds: tuple | None = None,
+                      level: int = 16):
+    """
+    Sort the distributed PS points by grid cell (grid_name, row, col)
+    and, within each cell, along a Hilbert curve.
+    Args:
+        gdf_smp: GeoDataFrame or Dask-GeoDataFrame containing the
+            distributed PS points.
+        total_bounds: bounds of the Hilbert curve domain, e.g. the grid
+            bounds. Default: the points bounds.
+        level: Hilbert curve level.
+    Returns: sorted GeoDataFrame or Dask-GeoDataFrame.
+    """
+    if isinstance(gdf_smp, gpd.GeoDataFrame) and len(gdf_smp) == 0:
+        return gdf_smp
+    if total_bounds is None:
+        total_bounds = gdf_smp.total_bounds
+        if hasattr(total_bounds, 'compute'):
+            total_bounds = total_bounds.compute()
+    keys = [c for c in ('grid_name', 'row', 'col') if c in gdf_smp.columns]
+    crs = gdf_smp.crs
+    gdf_smp = gdf_smp.assign(
+        hilbert_key=gdf_smp.hilbert_distance(total_bounds=total_bounds,
+                                             level=level))
+    gdf_smp = gdf_smp.sort_values(keys + ['hilbert_key'])
+    gdf_smp = gdf_smp.drop(columns='hilbert_key')
+    if not isinstance(gdf_smp, gpd.GeoDataFrame):
+        # - The distributed sort of a multi-partition input returns
+        # - pandas DataFrame partitions: restore GeoDataFrames.
+        gdf_smp = gdf_smp.map_partitions(gpd.GeoDataFrame, crs=crs,
+                                         meta=gdf_smp._meta)
+    return gdf_smp
+
+
+def save_ps_output(gdf_smp: gpd.GeoDataFrame, out_file: str) -> None:
+    """
+    Save the PS partition. The file is first written to a temporary
+    path and then moved over the destination, so that an existing
+    output is never left half-written.
+    GeoParquet outputs are spatially sorted (see sort_ps_spatially),
+    split into row groups of ROW_GROUP_SIZE points and include the
+    bounding box covering column (GeoParquet 1.1).
+    Args:
+        gdf_smp: GeoDataFrame containing the distributed PS points.
+        out_file: Absolute Path to the output file (parquet or shp).
+    Returns: None
+    """
+    base, ext = os.path.splitext(out_file)
+    tmp_file = f"{base}_tmp{ext}"
+    if ext == '.parquet':
+        sort_ps_spatially(gdf_smp).to_parquet(
+            tmp_file, index=False, write_covering_bbox=True,
+            row_group_size=ROW_GROUP_SIZE)
+    else:
+        gdf_smp.to_file(tmp_file)
+    # - A shapefile is made of several sidecar files.
+    replace_file(tmp_file, out_file)
+
+
+def save_ps_partitions(gdf_smp, out_file: str, batch_size: int = 4,
+                       max_pending: int = 2,
+                       total_bounds: tuple | None = None,
+                       n_rows: int | None = None) -> None:
+    """
+    Compute a Dask-GeoDataFrame batch by batch and stream the partitions
+    to the output file through a write-behind I/O thread, so that
+    writing a batch overlaps with the computation of the next one.
+    GeoParquet outputs are spatially sorted with an external bucket
+    sort, holding at most one batch or one bucket in memory:
+        1. the computed partitions are split into buckets of contiguous
+           grid rows and appended to temporary GeoParquet files;
+        2. the buckets are read in row order, sorted by grid cell and
+           along a Hilbert curve (see sort_ps_spatially) and appended
+           to the output file.
+    Args:
+        gdf_smp: Dask-GeoDataFrame containing the distributed PS points.
+        out_file: Absolute Path to the output file (parquet or shp).
+        batch_size: number of partitions computed together.
+        max_pending: maximum number of batches waiting to be written.
+        total_bounds: bounds of the Hilbert curve domain
+            (see sort_ps_spatially). Default: the bounds of each bucket.
+        n_rows: number of grid rows. Default: computed from the PS
+            points (additional pass over the input).
+    Returns: None
+    """
+    import dask
+    if not out_file.endswith('.parquet'):
+        output = ChunkedOutput(out_file)
+        try:
+            with AsyncWriter(max_pending=max_pending) as writer:
+                for gdf_part in _compute_batches(gdf_smp, batch_size):
+                    writer.submit(output.write, gdf_part)
+                writer.submit(output.close)
+        except BaseException:
+            # - The I/O thread is stopped: discard the partial output
+            output.abort()
+            raise
+    else:
+        if n_rows is None:
+            n_rows = int(dask.compute(gdf_smp['row'].max())[0]) + 1
+        bucket_rows = max(1, -(-n_rows // gdf_smp.npartitions))
+        base = os.path.splitext(out_file)[0]
+        tmp_dir = f"{base}_buckets.{os.getpid()}.tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+        output = ChunkedOutput(out_file, row_group_size=ROW_GROUP_SIZE,
+                               write_covering_bbox=True)
+        buckets = {}
+        try:
+            with AsyncWriter(max_pending=max_pending) as writer:
+                # - 1. Partitions -> buckets of grid rows
+                for gdf_part in _compute_batches(gdf_smp, batch_size):
+                    b_index = gdf_part['row'].to_numpy() // bucket_rows
+                    for b, p_index in pd.Series(b_index).groupby(
+                            b_index).indices.items():
+                        if b not in buckets:
+                            buckets[b] = ChunkedOutput(os.path.join(
+                                tmp_dir, f"bucket_{b:06d}.parquet"))
+                        writer.submit(buckets[b].write,
+                                      gdf_part.iloc[p_index])
+                for bucket in buckets.values():
+                    writer.submit(bucket.close)
+                writer.flush()
+                # - 2. Sorted buckets -> output file
+                for b in sorted(buckets):
+                    gdf_bucket = gpd.read_parquet(buckets[b].out_file)
+                    writer.submit(output.write, sort_ps_spatially(
+                        gdf_bucket, total_bounds=total_bounds))
+                writer.submit(output.close)
+        except BaseException:
+            for bucket in buckets.values():
+                bucket.abort()
+            output.abort()
+            raise
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    if output.n_rows == 0:
+        # - No PS points within the grid: write an empty output
+        save_ps_output(gdf_smp._meta, out_file)
+
+
+def _compute_batches(gdf_smp, batch_size: int):
+    """Compute the non-empty partitions of a Dask-GeoDataFrame
+    batch_size partitions at a time."""
+    import dask
+    parts = gdf_smp.to_delayed()
+    for b_start in range(0, len(parts), batch_size):
+        for gdf_part in dask.compute(*parts[b_start:b_start + batch_size]):
+            if len(gdf_part):
+                yield gdf_part
+
+
+def diff_ps_points(gdf_new: gpd.GeoDataFrame, gdf_old: gpd.GeoDataFrame,
+                   id_col: str = 'id') -> np.ndarray:
+    """
+    Compare two PS datasets by identifier and coordinates.
+    Args:
+        gdf_new: GeoDataFrame containing the new PS points.
+        gdf_old: GeoDataFrame containing the previous PS points.
+        id_col: PS unique identifier column.
+    Returns: boolean mask over gdf_new, True for points that are
+        not present in gdf_old or whose coordinates changed.
+    """
+    old_xy = pd.DataFrame({'x': gdf_old.geometry.x.to_numpy(),
+                           'y': gdf_old.geometry.y.to_numpy()},
+                          index=gdf_old[id_col].to_numpy())
+    old_xy = old_xy[~old_xy.index.duplicated(keep='first')]
+    # - Align previous coordinates to the new points. Missing ids -> NaN
+    old_xy = old_xy.reindex(gdf_new[id_col].to_numpy())
+    changed = ((old_xy['x'].to_numpy() != gdf_new.geometry.x.to_numpy())
+               | (old_xy['y'].to_numpy() != gdf_new.geometry.y.to_numpy()))
+    return changed
+
+
+def update_ps_grid(input_file: str, grid_file: str, previous_file: str,
+                   id_col: str = 'id') -> gpd.GeoDataFrame:
+    """
+    Incremental version of distribute_ps_grid. Points already present
+    in the previous output at the same location keep their grid
+    assignment, only new or moved points are spatially joined with
+    the grid. Points no longer present in the input are dropped.
+    NOTE: only the spatial join scales with the number of changed
+        points. The input is read in full (through the GeoParquet
+        cache) to detect the changes, and the whole output is
+        rewritten. Of the previous output only the identifier, the
+        geometry and the grid columns are read.
+    Args:
+        input_file: Absolute Path to the input file.
+        grid_file: Absolute Path to the grid file.
+        previous_file: Absolute Path to the previous _rc output file.
+        id_col: PS unique identifier column.
+    Returns: gpd.GeoDataFrame
+    """
+    if not os.path.isfile(input_file):
+        raise FileNotFoundError(f"File not found: {input_file}")
+    if not os.path.isfile(grid_file):
+        raise FileNotFoundError(f"File not found: {grid_file}")
+    # - Import PS Sample Data and the previous partition
+    gdf_new = read_cached(input_file).reset_index(drop=True)
+    # - Previous output: identifier and grid assignment only
+    if previous_file.endswith('.parquet'):
+        prev_cols = pq.read_schema(previous_file).names
+    else:
+        prev_cols = list(pyogrio.read_info(previous_file)['fields'])
+    gdf_old = read_ps_output(
+        previous_file, columns=[id_col] + [c for c in prev_cols
+                                           if c not in gdf_new.columns
+                                           and c != 'bbox'])
+
+    print(f"# - Input PS Sample: {input_file}")
+    print(f"# - Previous PS Partition: {previous_file}")
+    changed = diff_ps_points(gdf_new, gdf_old, id_col=id_col)
+    print(f"# - New or moved PS points: {int(changed.sum())} "
+          f"out of {len(gdf_new)}")
+
+    # - Carry over the grid columns for unchanged points
+    grid_cols = [c for c in gdf_old.columns if c not in gdf_new.columns]
+    assignment = (pd.DataFrame(gdf_old[[id_col] + grid_cols])
+                  .drop_duplicates(subset=id_col).set_index(id_col))
+    gdf_kept = gdf_new[~changed].join(assignment, on=id_col, how='inner')
+
+    # - Spatial join restricted to new or moved points
+    gdf_csk = read_cached(grid_file)
+    gdf_moved = gdf_new[changed].sjoin(gdf_csk, how="inner",
+                                       predicate="within")
+    gdf_moved = gdf_moved[[c for c in gdf_kept.columns
+                           if c in gdf_moved.columns]]
+
+    # - Restore input order
+    gdf_smp = pd.concat([gdf_kept, gdf_moved]).sort_index()
+    return gdf_smp.reset_index(drop=True)
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Add the command line arguments of distribute_ps_grid to a parser.
     """
-    # - Parse command line arguments
-    parser = argparse.ArgumentParser(
-        description="Distribute PS points over the CSK grid"
-    )
     # - Input file
     parser.add_argument('input_file', type=str,
                         help='Input file.')
@@ -86,12 +393,36 @@ def main() -> None:
                         help='Output directory.', default=os.getcwd())
     # - Output file format
     parser.add_argument('--out_format', '-F', type=str,
-                        help='Output file format.', default='parquet',
-                        choices=['parquet', 'shp'])
+                        help='Output file format. cube: displacement '
+                             'time-series cube (see ps_cube.py).',
+                        default='parquet', choices=['parquet', 'shp', 'cube'])
+    # - Incremental update of a previous output
+    parser.add_argument('--previous', '-U', type=str, default=None,
+                        help='Previous _rc output. Only new or moved PS '
+                             'points are re-assigned with a Spatial Join. '
+                             'The whole output is rewritten.')
+    # - PS unique identifier
+    parser.add_argument('--id_col', type=str, default='id',
+                        help='PS unique identifier column [def. id].')
     # - Plot Intermediate Results
     parser.add_argument('--plot', '-P', action='store_true',
                         help='Plot the results showing the PS partition.')
-    args = parser.parse_args()
+    # - Write-behind output stage
+    parser.add_argument('--batch_size', type=int, default=os.cpu_count(),
+                        help='Number of partitions computed together '
+                             '[def. number of CPUs].')
+    parser.add_argument('--max_pending', type=int, default=2,
+                        help='Maximum number of batches waiting to be '
+                             'written [def. 2].')
+
+
+def run(args: argparse.Namespace) -> None:
+    """
+    Use a Spatial Join to distribute the PS points available within
+    the boundaries of a CSK frame over the relative along-track grid.
+    Args:
+        args: parsed command line arguments. See add_arguments.
+    """
 
     # - import sample data
     smp_input = args.input_file
@@ -99,39 +430,78 @@ def main() -> None:
     # - Import CSK Along Track Grid
     csk_at_grid = args.grid_file
 
-    # - Distribute PS points over the CSK grid
-    gdf_smp = distribute_ps_grid(smp_input, csk_at_grid
-                                 )
-    # - Drop unnecessary columns
-    print("# - Drop unnecessary columns & Convert Dask-GeoDataFrame "
-          "to GeoDataFrame.")
-    gdf_smp = gdf_smp.drop(columns=['index_right', 'type', 'rand_point',
-                                    'index', 'name',  'csm_path'])
-    gdf_smp = gdf_smp.reset_index(drop=True)
-    gdf_smp = gdf_smp.compute()
+    if args.previous and args.out_format == 'cube':
+        raise ValueError("Incremental update (--previous) is not "
+                         "available for the cube output format.")
+    if args.previous:
+        # - Re-assign only new or moved PS points
+        gdf_smp = update_ps_grid(smp_input, csk_at_grid, args.previous,
+                                 id_col=args.id_col)
+        gdf_smp = gdf_smp.drop(columns=DROP_COLUMNS, errors='ignore')
+        # - Replace the previous output
+        out_file = args.previous
+    else:
+        # - Distribute PS points over the CSK grid
+        gdf_smp = distribute_ps_grid(smp_input, csk_at_grid
+                                     )
+        # - Drop unnecessary columns
+        print("# - Drop unnecessary columns & Convert Dask-GeoDataFrame "
+              "to GeoDataFrame.")
+        gdf_smp = gdf_smp.drop(columns=DROP_COLUMNS, errors='ignore')
+        gdf_smp = gdf_smp.reset_index(drop=True)
+
+        out_dir = args.out_dir
+        os.makedirs(out_dir, exist_ok=True)
+        ps_name = os.path.splitext(os.path.basename(smp_input))[0]
+        out_file = os.path.join(out_dir, f'{ps_name}_rc.{args.out_format}')
+        if args.out_format == 'cube':
+            # - Per-cell displacement time-series cube
+            from ps_cube import write_ps_cube
+            gdf_smp = gdf_smp.compute()
+            gdf_smp.insert(0, 'grid_name', os.path.splitext(
+                os.path.basename(csk_at_grid))[0])
+            cube = write_ps_cube(gdf_smp,
+                                 os.path.join(out_dir, f'{ps_name}_rc_cube'),
+                                 id_col=args.id_col)
+            print(f"# - {cube} saved to: {cube.cube_dir}")
+            return
+        if not args.plot:
+            # - Overlap the computation and the writing of the partitions
+            print("# - Compute and save the results.")
+            gdf_grid = read_cached(csk_at_grid, columns=['row'])
+            save_ps_partitions(gdf_smp, out_file,
+                               batch_size=args.batch_size,
+                               max_pending=args.max_pending,
+                               total_bounds=gdf_grid.total_bounds,
+                               n_rows=int(gdf_grid['row'].max()) + 1)
+            return
+        gdf_smp = gdf_smp.compute()
 
     # - Save the results
     print("# - Save the results.")
-    out_dir = args.out_dir
-    os.makedirs(out_dir, exist_ok=True)
-    out_file \
-        = os.path.join(out_dir, os.path.basename(smp_input)
-                       .replace('.shp', f'_rc.{args.out_format}'))
-
-    if args.out_format == 'shp':
-        gdf_smp.to_file(out_file)
-    else:
-        if os.path.isfile(out_file):
-            os.remove(out_file)
-        gdf_smp.to_parquet(out_file)
+    save_ps_output(gdf_smp, out_file)
 
     if args.plot:
+        import matplotlib.pyplot as plt
         # - Plot the results
         fig, ax = plt.subplots()
         gdf_smp.plot(ax=ax, c=gdf_smp['row'], cmap='viridis', legend=True)
         plt.show()
 
 
+def main() -> None:
+    """
+    Use a Spatial Join to distribute the PS points available within
+    the boundaries of a CSK frame over the relative along-track grid.
+    """
+    # - Parse command line arguments
+    parser = argparse.ArgumentParser(
+        description="Distribute PS points over the CSK grid"
+    )
+    add_arguments(parser)
+    run(parser.parse_args())
+
+
 # - run main program
 if __name__ == '__main__':
     start_time = datetime.now()
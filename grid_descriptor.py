@@ -0,0 +1,459 @@
+#!/usr/bin/env python
+u"""
+Parametric description of an along-track grid.
+
+The grids generated by generate_grid.py and create_grid_within_polygon
+are lattices defined in a rotated frame, where the track is aligned with
+the North-South direction:
+    - rows are delimited by n_rows + 1 equally spaced horizontal lines
+      y_r = y0 + r * dy;
+    - columns are delimited by n_cols + 1 straight lines, each one
+      defined by its top and bottom points (x_top, y_top) and
+      (x_bottom, y_bottom).
+The cell corners are obtained by intersecting the two families of lines.
+Cells are rotated back by 'angle' degrees around 'origin' and reprojected
+from the working CRS (EPSG:3857) to the output CRS.
+
+A GridDescriptor stores only these parameters (a few hundred bytes as
+JSON) and materializes the cell polygons on request: a single cell,
+a range of rows/columns or the cells intersecting a bounding box.
+Nested grids are obtained by refining a descriptor by an integer factor.
+
+Very large grids can be generated in chunks of whole rows (iter_cells),
+optionally dropping or clipping the cells outside a footprint polygon,
+and streamed to an OGR file (write_cell_chunks) without materializing
+the full grid in memory.
+
+Python Dependencies
+numpy: The fundamental package for scientific computing with Python:
+    https://numpy.org
+geopandas: Open source project to make working with geospatial data
+    in python easier: https://geopandas.org
+pyogrio: Vectorized spatial vector file format I/O using GDAL/OGR:
+    https://pyogrio.readthedocs.io
+pyproj: Python interface to PROJ (cartographic projections and coordinate
+    transformations library):
+    https://pyproj4.github.io/pyproj/stable/index.html
+shapely: Python package for manipulation and analysis of planar geometric
+    objects: https://shapely.readthedocs.io/en/stable/
+"""
+import os
+import json
+from collections.abc import Iterable, Iterator
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import pyogrio
+import shapely
+from shapely.geometry import Polygon, box
+from pyproj import Transformer
+# - Custom Dependencies
+from async_writer import replace_file, remove_file
+
+
+class GridDescriptor:
+    """
+    Parametric description of a lattice grid.
+    """
+    def __init__(self, x_top, y_top, x_bottom, y_bottom,
+                 y0: float, dy: float, n_rows: int,
+                 angle: float, origin: tuple[float, float],
+                 crs: int, work_crs: int = 3857, densify: int = 1) -> None:
+        self.x_top = np.asarray(x_top, dtype=float)
+        self.y_top = np.asarray(y_top, dtype=float)
+        self.x_bottom = np.asarray(x_bottom, dtype=float)
+        self.y_bottom = np.asarray(y_bottom, dtype=float)
+        if not (len(self.x_top) == len(self.y_top) == len(self.x_bottom)
+                == len(self.y_bottom)) or len(self.x_top) < 2:
+            raise ValueError("Column lines must be defined by arrays "
+                             "of equal length (n_cols + 1 >= 2).")
+        if n_rows < 1 or dy == 0:
+            raise ValueError("The grid must contain at least one row "
+                             "with non-zero height.")
+        self.y0 = float(y0)
+        self.dy = float(dy)
+        self.n_rows = int(n_rows)
+        self.angle = float(angle)
+        self.origin = (float(origin[0]), float(origin[1]))
+        self.crs = int(crs)
+        self.work_crs = int(work_crs)
+        # - Number of segments along each cell side (see refine)
+        self.densify = int(densify)
+        if self.densify < 1:
+            raise ValueError("densify must be >= 1.")
+
+    @property
+    def n_cols(self) -> int:
+        return len(self.x_top) - 1
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        """Grid shape (n_rows, n_cols)."""
+        return self.n_rows, self.n_cols
+
+    def __len__(self) -> int:
+        return self.n_rows * self.n_cols
+
+    def __repr__(self) -> str:
+        return (f"GridDescriptor(n_rows={self.n_rows}, n_cols={self.n_cols}"
+                f", angle={self.angle:.4f}, crs=EPSG:{self.crs})")
+
+    # - Serialization
+    def to_dict(self) -> dict:
+        """Return the grid parameters as a JSON serializable dictionary."""
+        return {'x_top': self.x_top.tolist(), 'y_top': self.y_top.tolist(),
+                'x_bottom': self.x_bottom.tolist(),
+                'y_bottom': self.y_bottom.tolist(),
+                'y0': self.y0, 'dy': self.dy, 'n_rows': self.n_rows,
+                'angle': self.angle, 'origin': list(self.origin),
+                'crs': self.crs, 'work_crs': self.work_crs,
+                'densify': self.densify}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'GridDescriptor':
+        """Create a GridDescriptor from a dictionary (see to_dict)."""
+        return cls(**d)
+
+    def to_json(self, out_file: str) -> None:
+        """Save the grid parameters to a JSON file."""
+        with open(out_file, 'w', encoding='utf-8') as f_out:
+            json.dump(self.to_dict(), f_out)
+
+    @classmethod
+    def from_json(cls, in_file: str) -> 'GridDescriptor':
+        """Read the grid parameters from a JSON file."""
+        with open(in_file, encoding='utf-8') as f_in:
+            return cls.from_dict(json.load(f_in))
+
+    # - Hierarchy
+    def refine(self, factor: int, densify: int = 1) -> 'GridDescriptor':
+        """
+        Subdivide each cell into factor x factor cells.
+        Row and column lines of this grid are kept, so that the cell
+        (row, col) is the exact union of the refined cells
+        (row * factor + i, col * factor + j) with 0 <= i, j < factor,
+        and refined indexes are rolled up with integer division.
+        Args:
+            factor: refinement factor (>= 1).
+            densify: split each side of the refined cells into densify
+                segments, with vertices at the corners of the cells of
+                refine(factor * densify). Straight sides in the working
+                CRS are not straight in the output CRS: densified cells
+                are the exact union of the finer cells in both CRSs.
+        Returns: GridDescriptor
+        """
+        factor = int(factor)
+        if factor < 1:
+            raise ValueError("Refinement factor must be >= 1.")
+        if factor == 1:
+            return GridDescriptor.from_dict({**self.to_dict(),
+                                             'densify': densify})
+        w_s = np.arange(factor) / factor
+
+        def split(a: np.ndarray) -> np.ndarray:
+            # - Insert factor - 1 equally spaced values between
+            # - consecutive column lines
+            a_s = a[:-1, np.newaxis] + np.diff(a)[:, np.newaxis] * w_s
+            return np.append(a_s.ravel(), a[-1])
+
+        return GridDescriptor(split(self.x_top), split(self.y_top),
+                              split(self.x_bottom), split(self.y_bottom),
+                              y0=self.y0, dy=self.dy / factor,
+                              n_rows=self.n_rows * factor, angle=self.angle,
+                              origin=self.origin, crs=self.crs,
+                              work_crs=self.work_crs, densify=densify)
+
+    # - Geometry
+    def line_x(self, y: float | np.ndarray) -> np.ndarray:
+        """
+        Evaluate the x coordinate of the column lines in the rotated frame.
+        Args:
+            y: y coordinate(s) in the rotated frame.
+        Returns: array of shape (..., n_cols + 1)
+        """
+        y = np.asarray(y, dtype=float)[..., np.newaxis]
+        return self.x_top + ((y - self.y_top) * (self.x_bottom - self.x_top)
+                             / (self.y_bottom - self.y_top))
+
+    def frame_corners(self, rows: np.ndarray,
+                      cols: np.ndarray) -> np.ndarray:
+        """
+        Compute the cell corners in the rotated frame.
+        Args:
+            rows: row indexes.
+            cols: column indexes (same shape as rows).
+        Returns: array of shape (n, 4 * densify + 1, 2) containing
+            the closed exterior ring of each cell.
+        """
+        rows = np.asarray(rows, dtype=int).ravel()
+        cols = np.asarray(cols, dtype=int).ravel()
+        if self.densify > 1:
+            return self._densified_corners(rows, cols)
+        y_a = self.y0 + rows * self.dy
+        y_b = y_a + self.dy
+        x_a = self.line_x(y_a)
+        x_b = self.line_x(y_b)
+        idx = np.arange(len(rows))
+        ring_x = np.stack([x_a[idx, cols], x_a[idx, cols + 1],
+                           x_b[idx, cols + 1], x_b[idx, cols],
+                           x_a[idx, cols]], axis=1)
+        ring_y = np.stack([y_a, y_a, y_b, y_b, y_a], axis=1)
+        return np.stack([ring_x, ring_y], axis=-1)
+
+    def _densified_corners(self, rows: np.ndarray,
+                           cols: np.ndarray) -> np.ndarray:
+        """
+        Cell rings with vertices at the corners of the sub-cells
+        of refine(densify). See frame_corners.
+        """
+        k = self.densify
+        fine = self.refine(k)
+        s_k = np.arange(k + 1)
+        # - Row lines (n, k + 1) and column lines indexes (n, k + 1)
+        y_s = fine.y0 + (rows[:, np.newaxis] * k + s_k) * fine.dy
+        c_s = cols[:, np.newaxis] * k + s_k
+
+        def line_x(y: np.ndarray, c: np.ndarray) -> np.ndarray:
+            return fine.x_top[c] + ((y - fine.y_top[c])
+                                    * (fine.x_bottom[c] - fine.x_top[c])
+                                    / (fine.y_bottom[c] - fine.y_top[c]))
+
+        y_a = y_s[:, :1]
+        y_b = y_s[:, -1:]
+        c_l = c_s[:, :1]
+        c_r = c_s[:, -1:]
+        # - Top (left to right), right (top to bottom), bottom
+        # - (right to left) and left (bottom to top) sides
+        ring_x = np.concatenate([line_x(y_a, c_s), line_x(y_s[:, 1:], c_r),
+                                 line_x(y_b, c_s[:, -2::-1]),
+                                 line_x(y_s[:, -2::-1], c_l)], axis=1)
+        ring_y = np.concatenate([np.broadcast_to(y_a, c_s.shape), y_s[:, 1:],
+                                 np.broadcast_to(y_b, c_s[:, 1:].shape),
+                                 y_s[:, -2::-1]], axis=1)
+        return np.stack([ring_x, ring_y], axis=-1)
+
+    def _rotate(self, xy: np.ndarray, angle: float) -> np.ndarray:
+        """Rotate coordinates by angle (degrees) around the grid origin."""
+        theta = np.radians(angle)
+        x_0, y_0 = self.origin
+        d_x = xy[..., 0] - x_0
+        d_y = xy[..., 1] - y_0
+        return np.stack([x_0 + d_x * np.cos(theta) - d_y * np.sin(theta),
+                         y_0 + d_x * np.sin(theta) + d_y * np.cos(theta)],
+                        axis=-1)
+
+    def _transformer(self, inverse: bool = False) -> Transformer:
+        """Transformer between the working and the output CRS."""
+        if inverse:
+            return Transformer.from_crs(self.crs, self.work_crs,
+                                        always_xy=True)
+        return Transformer.from_crs(self.work_crs, self.crs, always_xy=True)
+
+    def polygons(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        """
+        Materialize cell polygons in the output CRS.
+        Args:
+            rows: row indexes.
+            cols: column indexes (same shape as rows).
+        Returns: array of shapely Polygons.
+        """
+        ring = self._rotate(self.frame_corners(rows, cols), self.angle)
+        if self.crs != self.work_crs:
+            x_c, y_c = self._transformer().transform(ring[..., 0],
+                                                     ring[..., 1])
+            ring = np.stack([x_c, y_c], axis=-1)
+        return shapely.polygons(ring)
+
+    def cell(self, row: int, col: int) -> Polygon:
+        """Return a single cell polygon in the output CRS."""
+        if not (0 <= row < self.n_rows and 0 <= col < self.n_cols):
+            raise IndexError(f"Cell ({row}, {col}) outside grid "
+                             f"of shape {self.shape}.")
+        return self.polygons([row], [col])[0]
+
+    def _geodataframe(self, rows: np.ndarray,
+                      cols: np.ndarray) -> gpd.GeoDataFrame:
+        """Build the grid GeoDataFrame for the selected cells."""
+        rows = np.asarray(rows, dtype=int).ravel()
+        cols = np.asarray(cols, dtype=int).ravel()
+        d = {'index': rows * self.n_cols + cols, 'row': rows, 'col': cols,
+             'geometry': self.polygons(rows, cols)}
+        return gpd.GeoDataFrame(d, crs=f'EPSG:{self.crs}').set_index('index')
+
+    def cells(self, row_start: int = 0, row_stop: int | None = None,
+              col_start: int = 0,
+              col_stop: int | None = None) -> gpd.GeoDataFrame:
+        """
+        Materialize a range of rows and columns.
+        Args:
+            row_start, row_stop: row range [row_start, row_stop).
+            col_start, col_stop: column range [col_start, col_stop).
+        Returns: gpd.GeoDataFrame with 'row', 'col' and 'geometry' columns
+            indexed by the cell index (row * n_cols + col).
+        """
+        row_stop = self.n_rows if row_stop is None \
+            else min(row_stop, self.n_rows)
+        col_stop = self.n_cols if col_stop is None \
+            else min(col_stop, self.n_cols)
+        rows, cols = np.meshgrid(np.arange(max(row_start, 0), row_stop),
+                                 np.arange(max(col_start, 0), col_stop),
+                                 indexing='ij')
+        return self._geodataframe(rows, cols)
+
+    def to_geodataframe(self) -> gpd.GeoDataFrame:
+        """Materialize all the grid cells."""
+        return self.cells()
+
+    def cells_in_bbox(self, xmin: float, ymin: float, xmax: float,
+                      ymax: float) -> gpd.GeoDataFrame:
+        """
+        Materialize the cells intersecting a bounding box.
+        Args:
+            xmin, ymin, xmax, ymax: bounding box in the output CRS.
+        Returns: gpd.GeoDataFrame (see cells)
+        """
+        # - Bounding box in the rotated frame (conservative)
+        if self.crs != self.work_crs:
+            xmin_w, ymin_w, xmax_w, ymax_w = self._transformer(inverse=True) \
+                .transform_bounds(xmin, ymin, xmax, ymax, densify_pts=21)
+        else:
+            xmin_w, ymin_w, xmax_w, ymax_w = xmin, ymin, xmax, ymax
+        bbox_w = np.array([[xmin_w, ymin_w], [xmax_w, ymin_w],
+                           [xmax_w, ymax_w], [xmin_w, ymax_w]])
+        bbox_f = self._rotate(bbox_w, -self.angle)
+        u_min, v_min = bbox_f.min(axis=0)
+        u_max, v_max = bbox_f.max(axis=0)
+
+        # - Candidate rows
+        r_a, r_b = sorted([(v_min - self.y0) / self.dy,
+                           (v_max - self.y0) / self.dy])
+        r_lo = max(int(np.floor(r_a)), 0)
+        r_hi = min(int(np.ceil(r_b)), self.n_rows)
+        if r_lo >= r_hi:
+            return self._geodataframe([], [])
+        # - Candidate columns. Column lines are straight: their extreme
+        # - x values within the selected rows are reached at the
+        # - boundary of the rows range.
+        y_rng = [self.y0 + r_lo * self.dy, self.y0 + r_hi * self.dy]
+        x_rng = self.line_x(y_rng)
+        x_lo = x_rng.min(axis=0)
+        x_hi = x_rng.max(axis=0)
+        c_ok = ((np.maximum(x_hi[:-1], x_hi[1:]) >= u_min)
+                & (np.minimum(x_lo[:-1], x_lo[1:]) <= u_max))
+        cols_c = np.flatnonzero(c_ok)
+        rows, cols = np.meshgrid(np.arange(r_lo, r_hi), cols_c,
+                                 indexing='ij')
+        grid_gdf = self._geodataframe(rows, cols)
+        # - Exact test in the output CRS
+        return grid_gdf[grid_gdf.intersects(box(xmin, ymin, xmax, ymax))]
+
+    def iter_cells(self, chunk_size: int = 100_000,
+                   footprint: Polygon | None = None,
+                   clip: bool = False) -> Iterator[gpd.GeoDataFrame]:
+        """
+        Generate the grid cells in chunks of whole rows.
+        Args:
+            chunk_size: approximate number of cells per chunk.
+            footprint: if provided, only the cells intersecting this
+                polygon (output CRS) are returned.
+            clip: clip the cells crossing the footprint boundary.
+        Returns: iterator of gpd.GeoDataFrame (see cells). Empty chunks
+            are skipped.
+        """
+        rows_chunk = max(chunk_size // self.n_cols, 1)
+        if footprint is not None:
+            shapely.prepare(footprint)
+        for row_start in range(0, self.n_rows, rows_chunk):
+            grid_gdf = self.cells(row_start, row_start + rows_chunk)
+            if footprint is not None:
+                grid_gdf = clip_to_footprint(grid_gdf, footprint, clip=clip)
+            if len(grid_gdf):
+                yield grid_gdf
+
+
+def grids_geodataframe(descriptors: dict[str, GridDescriptor],
+                       out_dir: str | None = None,
+                       suffix: str = '') -> gpd.GeoDataFrame:
+    """
+    Materialize a set of grids into a single GeoDataFrame.
+    Args:
+        descriptors: dictionary {grid name: GridDescriptor}
+        out_dir: if provided, save each grid to a shapefile
+            in this directory.
+        suffix: suffix appended to the shapefile names.
+    Returns: gpd.GeoDataFrame containing the cells of all the grids.
+        Cells are identified by the 'grid_name', 'row' and 'col' columns.
+    """
+    grid_list = []
+    for grid_name, descriptor in descriptors.items():
+        gdf_grid = descriptor.to_geodataframe()
+        if out_dir is not None:
+            gdf_grid.to_file(os.path.join(out_dir,
+                                          f"{grid_name}{suffix}.shp"))
+        gdf_grid = gdf_grid.reset_index(drop=True)
+        gdf_grid.insert(0, 'grid_name', grid_name)
+        grid_list.append(gdf_grid)
+    return gpd.GeoDataFrame(pd.concat(grid_list, ignore_index=True),
+                            crs=grid_list[0].crs)
+
+
+def clip_to_footprint(grid_gdf: gpd.GeoDataFrame, footprint: Polygon,
+                      clip: bool = False) -> gpd.GeoDataFrame:
+    """
+    Drop the grid cells outside a footprint polygon.
+    Args:
+        grid_gdf: GeoDataFrame containing the grid cells.
+        footprint: footprint polygon (same CRS as grid_gdf). Preparing
+            it with shapely.prepare speeds up repeated calls.
+        clip: clip the cells crossing the footprint boundary.
+    Returns: gpd.GeoDataFrame
+    """
+    cells = grid_gdf.geometry.to_numpy()
+    # - Cells sharing only a boundary with the footprint are dropped
+    keep = shapely.intersects(footprint, cells) \
+        & ~shapely.touches(footprint, cells)
+    grid_gdf = grid_gdf[keep]
+    if not clip:
+        return grid_gdf
+    cells = cells[keep]
+    border = ~shapely.contains_properly(footprint, cells)
+    if border.any():
+        cells = cells.copy()
+        cells[border] = shapely.intersection(cells[border], footprint)
+        grid_gdf = grid_gdf.set_geometry(
+            gpd.GeoSeries(cells, index=grid_gdf.index, crs=grid_gdf.crs))
+    return grid_gdf
+
+
+def write_cell_chunks(chunks: Iterable[gpd.GeoDataFrame], out_file: str,
+                      **kwargs) -> int:
+    """
+    Stream chunks of grid cells to a single OGR file (ESRI shapefile,
+    GeoPackage, ...). Only one chunk is held in memory at a time.
+    Args:
+        chunks: iterable of GeoDataFrames sharing the same schema.
+        out_file: Absolute Path to the output file. The chunks are
+            written to a temporary file moved over the output when
+            complete. Existing files are overwritten.
+        kwargs: additional arguments passed to pyogrio.write_dataframe.
+    Returns: number of written cells. If no cells are written, an
+        existing output file from a previous run is removed.
+    """
+    base, ext = os.path.splitext(out_file)
+    tmp_file = f"{base}_tmp{ext}"
+    n_cells = 0
+    try:
+        for grid_gdf in chunks:
+            if len(grid_gdf) == 0:
+                continue
+            pyogrio.write_dataframe(grid_gdf.reset_index(), tmp_file,
+                                    append=n_cells > 0, **kwargs)
+            n_cells += len(grid_gdf)
+    except BaseException:
+        remove_file(tmp_file)
+        raise
+    if n_cells:
+        replace_file(tmp_file, out_file)
+    else:
+        remove_file(out_file)
+    return n_cells
@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+u"""
+Multi-resolution (hierarchical) along-track grids.
+
+Grid levels are obtained by refining a base grid (see generate_grid.py)
+by integer factors: level f splits each base cell into f x f cells.
+All the levels share the row and column lines of the coarser ones,
+and the sides of the coarse cells are densified with the vertices of
+the finest level, so that each coarse cell is the exact union of its
+fine cells (also after reprojection to the output CRS) and
+the cell (row, col) of the finest level F belongs to the cell
+(row // (F / f), col // (F / f)) of level f.
+
+PS points are assigned once to the finest level with a Spatial Join.
+The statistics of the coarser levels are then computed by rolling up
+the integer cell indexes, without any further spatial operation.
+
+Python Dependencies
+pandas: Python Data Analysis Library:
+    https://pandas.pydata.org
+geopandas: Open source project to make working with geospatial data
+    in python easier: https://geopandas.org
+"""
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+# - Custom Dependencies
+from grid_descriptor import GridDescriptor
+
+
+def check_levels(levels: list[int]) -> list[int]:
+    """
+    Validate a set of grid levels (refinement factors).
+    Args:
+        levels: refinement factors with respect to the base grid.
+    Returns: sorted list of unique levels.
+    """
+    levels = sorted({int(f) for f in levels})
+    if not levels or levels[0] < 1:
+        raise ValueError("Grid levels must be integers >= 1.")
+    if any(levels[-1] % f for f in levels):
+        raise ValueError(f"Grid levels {levels} must divide the finest "
+                         f"level ({levels[-1]}).")
+    return levels
+
+
+def level_suffix(level: int) -> str:
+    """Suffix appended to the name of a grid level (none for the base)."""
+    return '' if level == 1 else f'_L{level}'
+
+
+def grid_levels(descriptor: GridDescriptor,
+                levels: list[int]) -> dict[int, GridDescriptor]:
+    """
+    Generate the nested levels of a grid. The cell sides of the coarser
+    levels are densified with the vertices of the finest level, so that
+    each coarse cell is the exact union of its fine cells also in the
+    output CRS.
+    Args:
+        descriptor: base grid.
+        levels: refinement factors with respect to the base grid.
+    Returns: dictionary {level: GridDescriptor}
+    """
+    levels = check_levels(levels)
+    return {f: descriptor.refine(f, densify=levels[-1] // f)
+            for f in levels}
+
+
+def level_index(row: np.ndarray, col: np.ndarray,
+                factor: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Convert fine cell indexes into the indexes of a coarser level.
+    Args:
+        row, col: cell indexes at the fine level.
+        factor: ratio between the fine and the coarse level.
+    Returns: (row, col) at the coarse level.
+    """
+    return np.asarray(row) // factor, np.asarray(col) // factor
+
+
+def rollup_ps(gdf_ps: pd.DataFrame, factor: int,
+              columns: list[str] | None = None,
+              by: tuple[str, ...] = ('grid_name',)) -> pd.DataFrame:
+    """
+    Compute the statistics of the PS points at a coarser grid level.
+    Args:
+        gdf_ps: PS points assigned to the fine level ('row' and 'col'
+            columns).
+        factor: ratio between the fine and the coarse level.
+        columns: attribute columns to average. Default: none.
+        by: additional grouping columns (if available), e.g. the grid
+            name when the points are assigned to several tracks.
+    Returns: pd.DataFrame with the grouping columns, the coarse 'row'
+        and 'col', the number of PS points 'n_ps' and the average
+        of the selected columns.
+    """
+    keys = [c for c in by if c in gdf_ps.columns]
+    row, col = level_index(gdf_ps['row'], gdf_ps['col'], factor)
+    df_key = pd.DataFrame({**{c: gdf_ps[c].to_numpy() for c in keys},
+                           'row': row, 'col': col})
+    columns = [] if columns is None else list(columns)
+    df_val = pd.DataFrame({c: gdf_ps[c].to_numpy() for c in columns})
+    grouped = pd.concat([df_key, df_val], axis=1) \
+        .groupby(keys + ['row', 'col'], sort=True)
+    df_stats = grouped.size().rename('n_ps').to_frame()
+    if columns:
+        df_stats = df_stats.join(grouped[columns].mean())
+    return df_stats.reset_index()
+
+
+def rollup_levels(gdf_ps: pd.DataFrame, levels: list[int],
+                  columns: list[str] | None = None,
+                  by: tuple[str, ...] = ('grid_name',)) \
+        -> dict[int, pd.DataFrame]:
+    """
+    Compute the statistics of the PS points at all grid levels.
+    Args:
+        gdf_ps: PS points assigned to the finest level.
+        levels: refinement factors with respect to the base grid.
+        columns: attribute columns to average. See rollup_ps.
+        by: additional grouping columns. See rollup_ps.
+    Returns: dictionary {level: pd.DataFrame}
+    """
+    levels = check_levels(levels)
+    return {f: rollup_ps(gdf_ps, levels[-1] // f, columns=columns, by=by)
+            for f in levels}
+
+
+def rollup_geometry(df_stats: pd.DataFrame,
+                    descriptors: dict[str, GridDescriptor]) \
+        -> gpd.GeoDataFrame:
+    """
+    Attach the cell polygons to the statistics of a grid level.
+    Args:
+        df_stats: statistics computed by rollup_ps (with 'grid_name').
+        descriptors: dictionary {grid name: GridDescriptor} of the level.
+    Returns: gpd.GeoDataFrame
+    """
+    geometry = np.empty(len(df_stats), dtype=object)
+    crs = None
+    for grid_name, d_index in df_stats.groupby('grid_name').indices.items():
+        descriptor = descriptors[grid_name]
+        geometry[d_index] = descriptor.polygons(
+            df_stats['row'].to_numpy()[d_index],
+            df_stats['col'].to_numpy()[d_index])
+        crs = f'EPSG:{descriptor.crs}'
+    return gpd.GeoDataFrame(df_stats, geometry=geometry, crs=crs)
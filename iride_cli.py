@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+u"""
+Single command line entry point for the along-track grid tools.
+
+usage: iride_cli.py [-h] command ...
+
+positional arguments:
+  command
+    grid        Generate a regular grid along each MapItaly track
+                (mapitaly_at_grid.py).
+    frame-grid  Create a grid within each polygon of the input file
+                (mita_csk_frame_grid.py).
+    distribute  Distribute PS points over the CSK grid
+                (distribute_ps_grid.py).
+    pipeline    Generate the MapItaly grids and distribute the PS points
+                over them in a single process (mapitaly_pipeline.py).
+    batch       Run the tasks described by a YAML run specification,
+                skipping those already completed (batch_runner.py).
+    overlap     Build the cross-track overlap index of a set of
+                along-track grids (overlap_index.py).
+
+Run 'iride_cli.py <command> -h' for the options of each command.
+
+Only the module implementing the selected command is imported, and
+heavy optional dependencies (matplotlib, cartopy, dask) are imported
+by that module only on the code path that needs them. Startup time
+can be inspected with:
+    python -X importtime iride_cli.py <command> ... 2> importtime.log
+"""
+import sys
+import argparse
+import importlib
+from datetime import datetime
+
+# - Command name -> (implementing module, help string)
+COMMANDS = {
+    'grid': ('mapitaly_at_grid',
+             'Generate a regular grid along each MapItaly track.'),
+    'frame-grid': ('mita_csk_frame_grid',
+                   'Create a grid within each polygon of the input file.'),
+    'distribute': ('distribute_ps_grid',
+                   'Distribute PS points over the CSK grid.'),
+    'pipeline': ('mapitaly_pipeline',
+                 'Generate the MapItaly grids and distribute the PS points '
+                 'over them in a single process.'),
+    'batch': ('batch_runner',
+              'Run the tasks described by a YAML run specification, '
+              'skipping those already completed.'),
+    'overlap': ('overlap_index',
+                'Build the cross-track overlap index of a set of '
+                'along-track grids.'),
+}
+
+
+def build_parser(command: str | None = None) -> argparse.ArgumentParser:
+    """
+    Build the command line parser.
+    Args:
+        command: selected command. The arguments of this command only
+            are added to the parser, so that the modules implementing
+            the other commands are not imported.
+    Returns: argparse.ArgumentParser
+    """
+    parser = argparse.ArgumentParser(
+        description="Along-track grid tools for the MapItaly tracks."
+    )
+    subparsers = parser.add_subparsers(dest='command', metavar='command',
+                                       required=True)
+    for name, (module, help_str) in COMMANDS.items():
+        sub = subparsers.add_parser(name, help=help_str,
+                                    description=help_str)
+        if name == command:
+            importlib.import_module(module).add_arguments(sub)
+    return parser
+
+
+def main(argv: list[str] | None = None) -> None:
+    """
+    Parse the command line and run the selected command.
+    Args:
+        argv: command line arguments. Default: sys.argv[1:]
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv and argv[0] in COMMANDS else None
+    args = build_parser(command).parse_args(argv)
+    importlib.import_module(COMMANDS[args.command][0]).run(args)
+
+
+# - run main program
+if __name__ == '__main__':
+    start_time = datetime.now()
+    main()
+    end_time = datetime.now()
+    print(f"# - Computation Time: {end_time - start_time}")
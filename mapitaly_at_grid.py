@@ -7,9 +7,13 @@ Generate a regular grid along each COSMO-SkyMed track from
 the ASI MapItaly project.
 
 See generate_grid.py for more details about the grid generation algorithm.
+With --levels, each base grid is refined into nested levels saved to
+<grid name>_L<level> files (see grid_rollup.py).
 
 usage: mapitaly_at_grid.py [-h] [--out_dir OUT_DIR] [--buffer_dist BUFFER_DIST]
-    [--az_res AZ_RES] [--n_c N_C] [--plot] input_file
+    [--az_res AZ_RES] [--n_c N_C] [--plot] [--descriptor] [--no_polygons]
+    [--chunk_size CHUNK_SIZE] [--levels LEVELS [LEVELS ...]] [--overlap]
+    input_file
 
 Generate a regular grid along each of COSMO-SkyMed tracks from
 the MapItaly project.
@@ -27,6 +31,17 @@ options:
                         Cross track grid resolution (m) [def. 5e3m].
   --n_c N_C, -C N_C     Number of columns in the grid.
   --plot, -P            Save Map Showing the generated grid.
+  --descriptor, -D      Save the parametric grid description (JSON).
+  --no_polygons         Do not save the grid cells polygons.
+  --chunk_size CHUNK_SIZE
+                        Generate and save the grid cells in chunks of
+                        CHUNK_SIZE cells. All the cells are saved, as
+                        without chunks (track grids are not clipped).
+  --levels LEVELS [LEVELS ...], -L LEVELS [LEVELS ...]
+                        Generate nested grid levels (refinement factors of
+                        the base grid).
+  --overlap             Save the cross-track overlap index of the grids
+                        (overlap_index.npz).
 
 
 
@@ -53,23 +68,131 @@ import argparse
 from datetime import datetime
 from tqdm import tqdm
 import geopandas as gpd
-from matplotlib import pyplot as plt
-import matplotlib.patches as mpatches
-import cartopy.crs as ccrs
 # - Custom Dependencies
-from generate_grid import generate_grid
+from generate_grid import generate_grid_descriptor
+from grid_descriptor import grids_geodataframe, write_cell_chunks
+from grid_rollup import check_levels, grid_levels, level_suffix
+from async_writer import AsyncWriter
 from rm_z_coord import rm_z_coord
+from read_cached import read_cached
 
 
-def main() -> None:
+def track_parameters(p_gdf: gpd.GeoDataFrame) -> dict:
     """
-    Generate a regular grid along each of COSMO-SkyMed tracks
-    from the MapItaly project.
+    Extract the acquisition parameters of a MapItaly track.
+    Args:
+        p_gdf: GeoDataFrame containing the frames of a single track.
+    Returns: dictionary containing satellite name (sat), short satellite
+        name (sat_short), sensor mode (s_mode) and pass geometry
+        (pass_geom).
+    """
+    # - Extract track acquisition parameters
+    # - Beam [Sensor Mode] [Pass] [Satellite]
+    s_mode = p_gdf['SensorMode'].unique().tolist()[0]
+    # - Geometry
+    pass_geom = p_gdf['Pass'].unique().tolist()[0]
+    if pass_geom == 'ASCENDING':
+        pass_geom = 'ASC'
+    else:
+        pass_geom = 'DES'
+    # - Satellite
+    sat = p_gdf['Satellite'].unique().tolist()[0]
+    if sat == 'COSMO-SkyMed-1':
+        sat_short = 'CSK1'
+    elif sat == 'COSMO-SkyMed-2':
+        sat_short = 'CSK2'
+    elif sat == 'COSMO-SkyMed-SG-1':
+        sat_short = 'CSG1'
+    elif sat == 'COSMO-SkyMed-SG-2':
+        sat_short = 'CSG2'
+    else:
+        sat_short = 'CSM'   # - Match for Satellite Name not found.
+    return {'sat': sat, 'sat_short': sat_short,
+            's_mode': s_mode, 'pass_geom': pass_geom}
+
+
+def generate_track_grids(gdf: gpd.GeoDataFrame, n_c: int, az_res: float,
+                         buffer_dist: float, paths: list | None = None):
+    """
+    Generate a regular grid along each MapItaly track.
+    Args:
+        gdf: GeoDataFrame containing the MapItaly frames (no z coordinate).
+        n_c: number of columns of the output grid
+        az_res: grid azimuth resolution (m)
+        buffer_dist: grid buffer distance (m)
+        paths: subset of 'Path' values to process. Default: all tracks.
+    Yields: (path, track frames GeoDataFrame, grid name, GridDescriptor)
+        The grid cells are materialized with GridDescriptor.to_geodataframe.
+    """
+    # - Extract 'Path' column unique values
+    path_list = gdf['Path'].unique().tolist() if paths is None else paths
+    for p in path_list:
+        # - Extract data relative to a certain sub-track
+        p_gdf = gdf[gdf['Path'] == p].reset_index(drop=True)
+        descriptor = generate_grid_descriptor(p_gdf.copy(), n_c=n_c,
+                                              az_res=az_res,
+                                              buffer_dist=buffer_dist)
+        t_par = track_parameters(p_gdf)
+        grid_name = (f"grid_{t_par['sat_short']}_{p}_{t_par['s_mode']}_"
+                     f"{t_par['pass_geom']}")
+        yield p, p_gdf, grid_name, descriptor
+
+
+def plot_track_grid(gdf_grid: gpd.GeoDataFrame, p_gdf: gpd.GeoDataFrame,
+                    title: str, buffer_dist: float, out_png: str) -> None:
+    """
+    Save a map showing the grid generated along a track.
+    Args:
+        gdf_grid: GeoDataFrame containing the track grid.
+        p_gdf: GeoDataFrame containing the MapItaly track frames.
+        title: Figure title.
+        buffer_dist: grid buffer distance (m)
+        out_png: Absolute Path to the output figure.
+    Returns: None
+    """
+    # - Plotting libraries are only imported when a map is requested
+    from matplotlib import pyplot as plt
+    import matplotlib.patches as mpatches
+    import cartopy.crs as ccrs
+
+    plt.figure(figsize=(5, 5.2))
+    extent = [5, 20, 36, 48]
+    ax = plt.axes(projection=ccrs.PlateCarree())
+    ax.coastlines()
+    gdf_grid.plot(ax=ax, linewidth=0.2,
+                  facecolor="none", edgecolor="b", zorder=2)
+    p_gdf.plot(ax=ax, linewidth=0.1,
+               facecolor="r", edgecolor="r", zorder=1)
+    ax.set_extent(extent)
+    gl = ax.gridlines(draw_labels=True, linewidth=0.4, color='k',
+                      alpha=0.7, linestyle='--')
+    gl.top_labels = False
+    gl.right_labels = False
+    ax.set_title(title)
+    # place a text box in upper left in axes coords
+    text_str = f"{buffer_dist / 1e3} km buffer."
+    props = dict(boxstyle='square', facecolor='wheat',
+                 alpha=0.5)
+    plt.text(5.5, 47.7, text_str, transform=ccrs.PlateCarree(),
+             fontsize=6, verticalalignment='top', weight='bold',
+             bbox=props)
+
+    lc_colors = {
+        'MapItaly Track': "r",  # value=0
+        'AT Grid': "b",  # value=1
+    }
+    labels, handles = zip(
+        *[(k, mpatches.Rectangle((0, 0), 1, 1, facecolor=v)) for k, v
+          in lc_colors.items()])
+    ax.legend(handles, labels, loc=4, framealpha=1)
+    plt.savefig(out_png, dpi=300, bbox_inches='tight')
+    plt.close()
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Add the command line arguments of mapitaly_at_grid to a parser.
     """
-    parser = argparse.ArgumentParser(
-        description="""Generate a regular grid along each of COSMO-SkyMed 
-        tracks from the MapItaly project."""
-    )
     parser.add_argument('input_file', type=str,
                         help='Input file.')
     # - Output directory - default is current working directory
@@ -90,9 +213,35 @@ def main() -> None:
     # - Plot Intermediate Results
     parser.add_argument('--plot', '-P', action='store_true',
                         help='Save Map Showing the generated grid.')
-    # - Parse arguments
-    args = parser.parse_args()
+    # - Parametric grid description
+    parser.add_argument('--descriptor', '-D', action='store_true',
+                        help='Save the parametric grid description '
+                             '(JSON).')
+    parser.add_argument('--no_polygons', action='store_true',
+                        help='Do not save the grid cells polygons.')
+    # - Chunked generation for very large grids
+    parser.add_argument('--chunk_size', type=int, default=None,
+                        help='Generate and save the grid cells in chunks '
+                             'of CHUNK_SIZE cells. All the cells are saved, '
+                             'as without chunks (track grids are not '
+                             'clipped).')
+    # - Hierarchical grid
+    parser.add_argument('--levels', '-L', type=int, nargs='+',
+                        help='Generate nested grid levels (refinement '
+                             'factors of the base grid).', default=None)
+    # - Cross-track overlap index
+    parser.add_argument('--overlap', action='store_true',
+                        help='Save the cross-track overlap index of the '
+                             'grids (overlap_index.npz).')
 
+
+def run(args: argparse.Namespace) -> None:
+    """
+    Generate a regular grid along each of COSMO-SkyMed tracks
+    from the MapItaly project.
+    Args:
+        args: parsed command line arguments. See add_arguments.
+    """
     # - Number of Cells
     n_c = args.n_c        # - Along Track - Number of Columns
     az_res = args.az_res  # - Cross Track Resolution (km) - Azimuth Resolution
@@ -105,87 +254,82 @@ def main() -> None:
     os.makedirs(out_dir, exist_ok=True)
 
     # - Read data
-    gdf = gpd.read_file(dat_path)
+    gdf = read_cached(dat_path)
     print(f"# - Input GeoDataframe: {dat_path}")
     print(f"# - GeoDataframe shape: {gdf.shape}")
 
     # - Remove Z-Coordinate from geometry
     gdf = rm_z_coord(gdf)
 
-    # - Extract 'Path' column unique values
-    path_list = gdf['Path'].unique().tolist()
-    # - Loop through the GeoDataFrame lines and extract a reference grid
-    # # - for each sub-track.
-    for p in tqdm(path_list, desc='# - Processing Asc and Des tracks:',
-                  ncols=100):
-        # - Extract data relative to a certain sub-track
-        p_gdf = gdf[gdf['Path'] == p].reset_index(drop=True)
-        gdf_grid = generate_grid(p_gdf.copy(), n_c=n_c,
-                                 az_res=az_res,
-                                 buffer_dist=buffer_dist)
-
-        # - Extract track acquisition parameters
-        # - Beam [Sensor Mode] [Pass] [Satellite]
-        s_mode = p_gdf['SensorMode'].unique().tolist()[0]
-        # - Geometry
-        pass_geom = p_gdf['Pass'].unique().tolist()[0]
-        if pass_geom == 'ASCENDING':
-            pass_geom = 'ASC'
-        else:
-            pass_geom = 'DES'
-        # - Satellite
-        sat = p_gdf['Satellite'].unique().tolist()[0]
-        if sat == 'COSMO-SkyMed-1':
-            sat_short = 'CSK1'
-        elif sat == 'COSMO-SkyMed-2':
-            sat_short = 'CSK2'
-        elif sat == 'COSMO-SkyMed-SG-1':
-            sat_short = 'CSG1'
-        elif sat == 'COSMO-SkyMed-SG-2':
-            sat_short = 'CSG2'
-        else:
-            sat_short = 'CSM'   # - Match for Satellite Name not found.
-        out_name = f"grid_{sat_short}_{p}_{s_mode}_{pass_geom}.shp"
-
-        # - Save grid to file
-        out_path = os.path.join(out_dir, out_name)
-        gdf_grid.to_file(out_path)
-
-        if args.plot:
-            plt.figure(figsize=(5, 5.2))
-            extent = [5, 20, 36, 48]
-            ax = plt.axes(projection=ccrs.PlateCarree())
-            ax.coastlines()
-            gdf_grid.plot(ax=ax, linewidth=0.2,
-                          facecolor="none", edgecolor="b", zorder=2)
-            p_gdf.plot(ax=ax, linewidth=0.1,
-                       facecolor="r", edgecolor="r", zorder=1)
-            ax.set_extent(extent)
-            gl = ax.gridlines(draw_labels=True, linewidth=0.4, color='k',
-                              alpha=0.7, linestyle='--')
-            gl.top_labels = False
-            gl.right_labels = False
-            ax.set_title(f"{sat} - {p} - {s_mode} - {pass_geom}")
-            # place a text box in upper left in axes coords
-            text_str = f"{buffer_dist / 1e3} km buffer."
-            props = dict(boxstyle='square', facecolor='wheat',
-                         alpha=0.5)
-            plt.text(5.5, 47.7, text_str, transform=ccrs.PlateCarree(),
-                     fontsize=6, verticalalignment='top', weight='bold',
-                     bbox=props)
-
-            lc_colors = {
-                'MapItaly Track': "r",  # value=0
-                'AT Grid': "b",  # value=1
-            }
-            labels, handles = zip(
-                *[(k, mpatches.Rectangle((0, 0), 1, 1, facecolor=v)) for k, v
-                  in lc_colors.items()])
-            ax.legend(handles, labels, loc=4, framealpha=1)
-            plt.savefig(os.path.join(out_dir, f"{out_name}"
-                                     .replace(".shp", ".png")),
-                        dpi=300, bbox_inches='tight')
-            plt.close()
+    # - Loop through the MapItaly tracks and extract a reference grid
+    # - for each sub-track.
+    n_tracks = gdf['Path'].nunique()
+    levels = [1] if args.levels is None else check_levels(args.levels)
+    track_grids = {}
+    # - Grid files are written by a background I/O thread while
+    # - the grid of the next track is computed.
+    with AsyncWriter(max_pending=2) as writer:
+        for p, p_gdf, track_grid, track_dsc \
+                in tqdm(generate_track_grids(gdf, n_c=n_c, az_res=az_res,
+                                             buffer_dist=buffer_dist),
+                        desc='# - Processing Asc and Des tracks:',
+                        total=n_tracks, ncols=100):
+            track_grids[track_grid] = track_dsc
+            for level, descriptor in grid_levels(track_dsc, levels).items():
+                grid_name = f"{track_grid}{level_suffix(level)}"
+                out_name = f"{grid_name}.shp"
+
+                if args.descriptor:
+                    # - Save the parametric grid description
+                    descriptor.to_json(os.path.join(out_dir,
+                                                    f"{grid_name}.json"))
+                if args.no_polygons and not args.plot:
+                    continue
+                out_path = os.path.join(out_dir, out_name)
+                if args.chunk_size and not args.plot:
+                    # - Stream the grid cells to file, one chunk at a time.
+                    # - The track grid already covers the buffered track
+                    # - extent: cells are not clipped to a footprint, so
+                    # - the output matches the non-chunked one.
+                    writer.submit(write_cell_chunks, descriptor.iter_cells(
+                        chunk_size=args.chunk_size), out_path)
+                    continue
+                gdf_grid = descriptor.to_geodataframe()
+
+                # - Save grid to file
+                if not args.no_polygons:
+                    writer.submit(gdf_grid.to_file, out_path)
+
+                if args.plot:
+                    t_par = track_parameters(p_gdf)
+                    plot_track_grid(gdf_grid, p_gdf,
+                                    f"{t_par['sat']} - {p} - "
+                                    f"{t_par['s_mode']} - "
+                                    f"{t_par['pass_geom']}",
+                                    buffer_dist,
+                                    os.path.join(out_dir, f"{out_name}"
+                                                 .replace(".shp", ".png")))
+
+    if args.overlap:
+        # - Cross-track overlap index of the base grids
+        from overlap_index import OverlapIndex
+        index = OverlapIndex.from_grids(grids_geodataframe(track_grids))
+        index.save(os.path.join(out_dir, 'overlap_index.npz'))
+        print(f"# - {index}")
+
+
+def main() -> None:
+    """
+    Generate a regular grid along each of COSMO-SkyMed tracks
+    from the MapItaly project.
+    """
+    parser = argparse.ArgumentParser(
+        description="""Generate a regular grid along each of COSMO-SkyMed 
+        tracks from the MapItaly project."""
+    )
+    add_arguments(parser)
+    # - Parse arguments
+    run(parser.parse_args())
 
 
 # - run main program
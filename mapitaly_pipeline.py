@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+u"""
+In-memory processing chain from the MapItaly frames to the distribution
+of the PS points over the along-track grids.
+
+    1. Read the MapItaly frames and remove the z coordinate.
+    2. Generate a regular grid along each track (see generate_grid.py).
+    3. Assign the PS points of each input file to the grid cells
+       of all the tracks covering them (Spatial Join).
+    4. Save one output file per PS input.
+
+With --levels, nested grids are generated by refining the base grid
+(see grid_rollup.py). The PS points are assigned to the finest level
+only; the statistics of every level (number of PS and average of
+the --rollup_cols columns per cell) are computed by integer index
+roll-up and saved to <ps name>_rc_L<level> files.
+
+The grids are kept in memory between the stages and are saved to disk
+only if requested (--save_grids). The distributed PS points of each
+input are written as soon as they are computed and then released.
+
+usage: mapitaly_pipeline.py [-h] [--out_dir OUT_DIR]
+    [--buffer_dist BUFFER_DIST] [--az_res AZ_RES] [--n_c N_C]
+    [--tracks TRACKS [TRACKS ...]] [--out_format {parquet,shp}]
+    [--save_grids] [--levels LEVELS [LEVELS ...]]
+    [--rollup_cols ROLLUP_COLS [ROLLUP_COLS ...]]
+    frames_file ps_files [ps_files ...]
+
+positional arguments:
+  frames_file           MapItaly frames file.
+  ps_files              PS input files.
+
+options:
+  -h, --help            show this help message and exit
+  --out_dir OUT_DIR, -O OUT_DIR
+                        Output directory.
+  --buffer_dist BUFFER_DIST, -B BUFFER_DIST
+                        Buffer distance.
+  --az_res AZ_RES, -R AZ_RES
+                        Cross track grid resolution (m) [def. 5e3m].
+  --n_c N_C, -C N_C     Number of columns in the grid.
+  --tracks TRACKS [TRACKS ...], -T TRACKS [TRACKS ...]
+                        Subset of track Path values to process.
+  --out_format {parquet,shp}, -F {parquet,shp}
+                        Output file format.
+  --save_grids, -S      Save the track grids to shapefiles.
+  --levels LEVELS [LEVELS ...], -L LEVELS [LEVELS ...]
+                        Hierarchical grid levels (refinement factors of
+                        the base grid).
+  --rollup_cols ROLLUP_COLS [ROLLUP_COLS ...]
+                        PS columns averaged at each grid level.
+
+Python Dependencies
+geopandas: Open source project to make working with geospatial data
+    in python easier: https://geopandas.org
+"""
+import os
+import argparse
+from datetime import datetime
+import geopandas as gpd
+# - Custom Dependencies
+from rm_z_coord import rm_z_coord
+from read_cached import read_cached
+from mapitaly_at_grid import generate_track_grids
+from grid_descriptor import GridDescriptor, grids_geodataframe
+from grid_rollup import (check_levels, grid_levels, level_suffix,
+                         rollup_levels, rollup_geometry)
+from distribute_ps_grid import DROP_COLUMNS, save_ps_output
+
+
+def mapitaly_descriptors(frames_file: str, n_c: int = 3,
+                         az_res: float = 5e3, buffer_dist: float = 5e3,
+                         tracks: list | None = None) \
+        -> dict[str, GridDescriptor]:
+    """
+    Compute the parametric description of the MapItaly along-track grids.
+    Args:
+        frames_file: Absolute Path to the MapItaly frames file.
+        n_c: number of columns of the output grid
+        az_res: grid azimuth resolution (m)
+        buffer_dist: grid buffer distance (m)
+        tracks: subset of 'Path' values to process. Default: all tracks.
+    Returns: dictionary {grid name: GridDescriptor}
+    """
+    # - Read data and remove Z-Coordinate from geometry
+    gdf = rm_z_coord(read_cached(frames_file))
+    if tracks is not None:
+        # - Path values are read as integers or strings
+        tracks = [p for p in gdf['Path'].unique()
+                  if str(p) in {str(t) for t in tracks}]
+    return {grid_name: descriptor
+            for _, _, grid_name, descriptor
+            in generate_track_grids(gdf, n_c=n_c, az_res=az_res,
+                                    buffer_dist=buffer_dist, paths=tracks)}
+
+
+def mapitaly_grids(frames_file: str, n_c: int = 3, az_res: float = 5e3,
+                   buffer_dist: float = 5e3, tracks: list | None = None,
+                   out_dir: str | None = None) -> gpd.GeoDataFrame:
+    """
+    Generate the along-track grids of the MapItaly tracks.
+    Args:
+        frames_file: Absolute Path to the MapItaly frames file.
+        n_c: number of columns of the output grid
+        az_res: grid azimuth resolution (m)
+        buffer_dist: grid buffer distance (m)
+        tracks: subset of 'Path' values to process. Default: all tracks.
+        out_dir: if provided, save each grid to a shapefile
+            in this directory.
+    Returns: gpd.GeoDataFrame containing the cells of all the grids.
+        Cells are identified by the 'grid_name', 'row' and 'col' columns.
+    """
+    return grids_geodataframe(
+        mapitaly_descriptors(frames_file, n_c=n_c, az_res=az_res,
+                             buffer_dist=buffer_dist, tracks=tracks),
+        out_dir=out_dir)
+
+
+def assign_ps_grids(gdf_ps: gpd.GeoDataFrame,
+                    gdf_grids: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """
+    Use a Spatial Join to distribute PS points over a set of grids.
+    A PS point covered by the grids of several tracks appears once
+    for each track.
+    Args:
+        gdf_ps: GeoDataFrame containing the PS points.
+        gdf_grids: GeoDataFrame containing the grid cells.
+    Returns: gpd.GeoDataFrame
+    """
+    if gdf_ps.crs != gdf_grids.crs:
+        gdf_ps = gdf_ps.to_crs(gdf_grids.crs)
+    gdf_smp = gdf_ps.sjoin(gdf_grids, how="inner", predicate="within")
+    gdf_smp = gdf_smp.drop(columns=DROP_COLUMNS, errors='ignore')
+    return gdf_smp.reset_index(drop=True)
+
+
+def run_pipeline(frames_file: str, ps_files: list[str], n_c: int = 3,
+                 az_res: float = 5e3, buffer_dist: float = 5e3,
+                 tracks: list | None = None, out_dir: str | None = None,
+                 out_format: str = 'parquet',
+                 save_grids: bool = False, levels: list[int] | None = None,
+                 rollup_cols: list[str] | None = None) -> dict:
+    """
+    Generate the MapItaly along-track grids and distribute the PS points
+    over them in a single process.
+    Args:
+        frames_file: Absolute Path to the MapItaly frames file.
+        ps_files: list of Absolute Paths to the PS input files.
+        n_c: number of columns of the output grid
+        az_res: grid azimuth resolution (m)
+        buffer_dist: grid buffer distance (m)
+        tracks: subset of 'Path' values to process. Default: all tracks.
+        out_dir: output directory. If None, nothing is written to disk.
+        out_format: output file format (parquet or shp).
+        save_grids: save the track grids to shapefiles in out_dir
+            (<grid name>_L<level>.shp for levels other than 1).
+        levels: hierarchical grid levels (see grid_rollup.py). The PS
+            points are assigned to the finest level only, and the
+            statistics of each level are saved to
+            <ps name>_rc_L<level>.<out_format>.
+        rollup_cols: PS attribute columns averaged at each level.
+    Returns: dictionary {PS input file: output file}. If out_dir is None,
+        dictionary {PS input file: distributed PS GeoDataFrame}.
+    """
+    if out_dir is not None:
+        os.makedirs(out_dir, exist_ok=True)
+    for ps_file in ps_files:
+        if not os.path.isfile(ps_file):
+            raise FileNotFoundError(f"File not found: {ps_file}")
+    levels = [1] if levels is None else check_levels(levels)
+    print(f"# - Input MapItaly Frames: {frames_file}")
+    descriptors = mapitaly_descriptors(frames_file, n_c=n_c, az_res=az_res,
+                                       buffer_dist=buffer_dist,
+                                       tracks=tracks)
+    level_dsc = {}
+    for grid_name, descriptor in descriptors.items():
+        for f, d_level in grid_levels(descriptor, levels).items():
+            level_dsc.setdefault(f, {})[grid_name] = d_level
+    if save_grids and out_dir is not None:
+        for f in levels[:-1]:
+            grids_geodataframe(level_dsc[f], out_dir=out_dir,
+                               suffix=level_suffix(f))
+    gdf_grids = grids_geodataframe(
+        level_dsc[levels[-1]], out_dir=out_dir if save_grids else None,
+        suffix=level_suffix(levels[-1]))
+    print(f"# - Number of grid cells: {len(gdf_grids)}")
+
+    ps_out = {}
+    for ps_file in ps_files:
+        print(f"# - Input PS Sample: {ps_file}")
+        gdf_smp = assign_ps_grids(read_cached(ps_file), gdf_grids)
+        if out_dir is not None:
+            out_file \
+                = os.path.join(out_dir, os.path.basename(ps_file)
+                               .replace('.shp', f'_rc.{out_format}'))
+            save_ps_output(gdf_smp, out_file)
+            print(f"# - PS Partition saved to: {out_file}")
+            if len(levels) > 1:
+                # - Coarser levels: integer index roll-up
+                for f, df_stats in rollup_levels(gdf_smp, levels,
+                                                 columns=rollup_cols).items():
+                    save_ps_output(rollup_geometry(df_stats, level_dsc[f]),
+                                   out_file.replace('_rc.', f'_rc_L{f}.'))
+            # - Keep only the output path: memory does not grow
+            # - with the number of PS inputs.
+            ps_out[ps_file] = out_file
+        else:
+            ps_out[ps_file] = gdf_smp
+    return ps_out
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Add the command line arguments of mapitaly_pipeline to a parser.
+    """
+    parser.add_argument('frames_file', type=str,
+                        help='MapItaly frames file.')
+    parser.add_argument('ps_files', type=str, nargs='+',
+                        help='PS input files.')
+    # - Output directory - default is current working directory
+    parser.add_argument('--out_dir', '-O', type=str,
+                        help='Output directory.', default=os.getcwd())
+    # - Buffer distance
+    parser.add_argument('--buffer_dist', '-B', type=float,
+                        help='Buffer distance.', default=5e3)
+    # - Along Track Resolution
+    parser.add_argument('--az_res', '-R', type=float,
+                        help='Cross track grid resolution (m) [def. 5e3m].',
+                        default=5e3)
+    # - Number of Columns
+    parser.add_argument('--n_c', '-C', type=int,
+                        help='Number of columns in the grid.',
+                        default=3)
+    # - Tracks subset
+    parser.add_argument('--tracks', '-T', type=str, nargs='+',
+                        help='Subset of track Path values to process.',
+                        default=None)
+    # - Output file format
+    parser.add_argument('--out_format', '-F', type=str,
+                        help='Output file format.', default='parquet',
+                        choices=['parquet', 'shp'])
+    # - Save intermediate grids
+    parser.add_argument('--save_grids', '-S', action='store_true',
+                        help='Save the track grids to shapefiles.')
+    # - Hierarchical grid
+    parser.add_argument('--levels', '-L', type=int, nargs='+',
+                        help='Hierarchical grid levels (refinement factors '
+                             'of the base grid).', default=None)
+    parser.add_argument('--rollup_cols', type=str, nargs='+',
+                        help='PS columns averaged at each grid level.',
+                        default=None)
+
+
+def run(args: argparse.Namespace) -> None:
+    """
+    Run the processing chain from the command line arguments.
+    Args:
+        args: parsed command line arguments. See add_arguments.
+    """
+    run_pipeline(args.frames_file, args.ps_files, n_c=args.n_c,
+                 az_res=args.az_res, buffer_dist=args.buffer_dist,
+                 tracks=args.tracks, out_dir=args.out_dir,
+                 out_format=args.out_format, save_grids=args.save_grids,
+                 levels=args.levels, rollup_cols=args.rollup_cols)
+
+
+def main() -> None:
+    """
+    Generate the MapItaly along-track grids and distribute the PS points
+    over them in a single process.
+    """
+    parser = argparse.ArgumentParser(
+        description="""Generate the MapItaly along-track grids and
+        distribute the PS points over them."""
+    )
+    add_arguments(parser)
+    run(parser.parse_args())
+
+
+# - run main program
+if __name__ == '__main__':
+    start_time = datetime.now()
+    main()
+    end_time = datetime.now()
+    print(f"# - Computation Time: {end_time - start_time}")
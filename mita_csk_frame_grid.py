@@ -6,22 +6,121 @@ January 2024
 Process a shapefile, create grids within polygons, and save the result
 to separate shapefiles.
 
+usage: mita_csk_frame_grid.py [-h] [--out_dir OUT_DIR]
+    [--buffer_dist BUFFER_DIST] [--x_frame_split X_FRAME_SPLIT]
+    [--y_frame_split Y_FRAME_SPLIT] [--dissolve] [--descriptor]
+    [--chunk_size CHUNK_SIZE] [--clip] input_file
+
+positional arguments:
+  input_file            Input file.
+
+options:
+  -h, --help            show this help message and exit
+  --out_dir OUT_DIR, -O OUT_DIR
+                        Output directory.
+  --buffer_dist BUFFER_DIST, -B BUFFER_DIST
+                        Buffer distance (m).
+  --x_frame_split X_FRAME_SPLIT, -X X_FRAME_SPLIT
+                        Number of columns in the grid.
+  --y_frame_split Y_FRAME_SPLIT, -Y Y_FRAME_SPLIT
+                        Number of rows in the grid.
+  --dissolve, -D        Dissolve the input polygons into a single grid.
+  --descriptor          Save the parametric grid description (JSON).
+  --chunk_size CHUNK_SIZE
+                        Generate the grid in chunks of CHUNK_SIZE cells,
+                        dropping the cells outside the input polygons.
+  --clip                Clip the cells crossing the input polygons boundary
+                        (with --chunk_size).
+
 Python Dependencies
 geopandas: Open source project to make working with geospatial data
     in python easier: https://geopandas.org
 """
 
 import os
+import argparse
+from datetime import datetime
 import geopandas as gpd
 from mita_csk_frame_grid_utils import (reproject_geodataframe,
                                        create_grid_within_polygon,
+                                       grid_descriptor_within_polygon,
+                                       iter_grid_within_polygon,
                                        add_frame_code_field)
+from grid_descriptor import write_cell_chunks
+from read_cached import read_cached
+
+
+def frame_code_chunks(chunks):
+    """
+    Add the "f_code" field to a stream of grid chunks, numbering the
+    cells consecutively across chunks (see add_frame_code_field).
+    """
+    n_cells = 0
+    for grid_gdf in chunks:
+        grid_gdf['f_code'] = range(n_cells + 1, n_cells + len(grid_gdf) + 1)
+        n_cells += len(grid_gdf)
+        yield grid_gdf
+
+
+def save_grid(geometry, output_file: str, orig_epsg: int,
+              x_frame_split: int, y_frame_split: int,
+              descriptor: bool = False, chunk_size: int = None,
+              clip: bool = False) -> bool:
+    """
+    Create the grid within a polygon and save it to a shapefile.
+
+    Parameters:
+        geometry (Polygon): Input polygon (EPSG:3857).
+        output_file (str): Path to the output shapefile.
+        orig_epsg (int): EPSG code of the output grid.
+        x_frame_split (int): Number of columns in the grid.
+        y_frame_split (int): Number of rows in the grid.
+        descriptor (bool, optional): Also save the parametric description
+            of the grid to a JSON file next to the shapefile.
+        chunk_size (int, optional): If provided, generate the grid in
+            chunks of cells streamed to the output file, dropping the
+            cells outside the polygon.
+        clip (bool, optional): Clip the cells crossing the polygon
+            boundary (chunked generation only).
+
+    Returns:
+        bool: True if the output shapefile was written.
+    """
+    if chunk_size:
+        grid_dsc = grid_descriptor_within_polygon(
+            geometry, x_frame_split, y_frame_split, crs=orig_epsg)
+        chunks = iter_grid_within_polygon(geometry, x_frame_split,
+                                          y_frame_split,
+                                          chunk_size=chunk_size, clip=clip,
+                                          crs=orig_epsg, descriptor=grid_dsc)
+        written = write_cell_chunks(frame_code_chunks(chunks),
+                                    output_file) > 0
+    else:
+        # Generates the fishnet grid of input frame polygons
+        grid_gdf, grid_dsc \
+            = create_grid_within_polygon(geometry,
+                                         x_frame_split, y_frame_split,
+                                         return_descriptor=True)
+        # Reproject to the original coordinate reference system
+        grid_gdf = reproject_geodataframe(grid_gdf, orig_epsg)
+        grid_gdf = add_frame_code_field(grid_gdf)
+        grid_gdf.to_file(output_file)
+        written = True
+    json_file = output_file.replace('.shp', '.json')
+    if written and descriptor:
+        grid_dsc.crs = orig_epsg
+        grid_dsc.to_json(json_file)
+    elif not written and os.path.isfile(json_file):
+        # - No cells: remove the descriptor of a previous run
+        os.remove(json_file)
+    return written
 
 
 def grid_from_area(input_shapefile: str, output_folder: str,
                    buffer_dist: float = None, x_frame_split: int = 3,
-                   y_frame_split: int = 6, dissolve: bool = False) \
-        -> list[str]:
+                   y_frame_split: int = 6, dissolve: bool = False,
+                   descriptor: bool = False, chunk_size: int = None,
+                   clip: bool = False) -> list[str]:
     """
     Process a shapefile, create grids within polygons, and save the result
     to separate shapefiles.
@@ -35,12 +134,19 @@ def grid_from_area(input_shapefile: str, output_folder: str,
         y_frame_split (int, optional): Number of rows in the grid.
         dissolve (bool, optional): Whether to dissolve the polygons
         in the input shapefile.
+        descriptor (bool, optional): Also save the parametric description
+            of each grid to a JSON file next to the shapefile.
+        chunk_size (int, optional): Generate the grids in chunks of cells
+            streamed to the output files, dropping the cells outside
+            the input polygons. Memory usage is bounded by the chunk size.
+        clip (bool, optional): Clip the cells crossing the polygons
+            boundary (chunked generation only).
 
     Returns:
         output_files (list): List of paths to the saved output shapefiles.
     """
     # Read the input shapefile
-    gdf = gpd.read_file(input_shapefile)
+    gdf = read_cached(input_shapefile)
     orig_epsg = gdf.crs.to_epsg()
 
     # Reproject to EPSG:3857
@@ -52,34 +158,95 @@ def grid_from_area(input_shapefile: str, output_folder: str,
                                                 cap_style=3, join_style=2)
         gdf = gpd.GeoDataFrame(geometry=buffered_polygons, crs=gdf.crs)
 
-    output_files = []
-
     # Check if dissolve is needed
     if dissolve and len(gdf['geometry']) > 1:
-        dissolved_geometry = gdf.unary_union
-        # Get the centroid of non-rotated dissolved geometries
-        centroid = (dissolved_geometry.centroid.x,
-                    dissolved_geometry.centroid.y)
-        # Generates the fishnet grid of input frame polygons
-        grid_gdf = create_grid_within_polygon(dissolved_geometry,
-                                              x_frame_split, y_frame_split)
-        # Reproject to the original coordinate
-        grid_gdf = reproject_geodataframe(grid_gdf, orig_epsg)
-        grid_gdf = add_frame_code_field(grid_gdf)
-        output_file = os.path.join(output_folder, f'grid_dissolved.shp')
-        grid_gdf.to_file(output_file)
-        output_files.append(output_file)
+        grids = [(gdf.unary_union, 'grid_dissolved.shp')]
     else:
         # Process each polygon in the GeoDataFrame
-        for idx, geometry in enumerate(gdf['geometry']):
-            grid_gdf = create_grid_within_polygon(geometry,
-                                                  x_frame_split, y_frame_split)
-            # reproject to the original coordinate reference system
-            grid_gdf = reproject_geodataframe(grid_gdf, orig_epsg)
-            grid_gdf = add_frame_code_field(grid_gdf)
-            # Save the grid to a new shapefile
-            output_file = os.path.join(output_folder, f'grid_{idx + 1}.shp')
-            grid_gdf.to_file(output_file)
+        grids = [(geometry, f'grid_{idx + 1}.shp')
+                 for idx, geometry in enumerate(gdf['geometry'])]
+
+    output_files = []
+    for geometry, output_name in grids:
+        output_file = os.path.join(output_folder, output_name)
+        if save_grid(geometry, output_file, orig_epsg,
+                     x_frame_split, y_frame_split, descriptor=descriptor,
+                     chunk_size=chunk_size, clip=clip):
             output_files.append(output_file)
-    
+
     return output_files
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Add the command line arguments of mita_csk_frame_grid to a parser.
+    """
+    parser.add_argument('input_file', type=str,
+                        help='Input file.')
+    # - Output directory - default is current working directory
+    parser.add_argument('--out_dir', '-O', type=str,
+                        help='Output directory.', default=os.getcwd())
+    # - Buffer distance
+    parser.add_argument('--buffer_dist', '-B', type=float,
+                        help='Buffer distance (m).', default=None)
+    # - Grid Size
+    parser.add_argument('--x_frame_split', '-X', type=int,
+                        help='Number of columns in the grid.', default=3)
+    parser.add_argument('--y_frame_split', '-Y', type=int,
+                        help='Number of rows in the grid.', default=6)
+    # - Dissolve input polygons
+    parser.add_argument('--dissolve', '-D', action='store_true',
+                        help='Dissolve the input polygons into '
+                             'a single grid.')
+    # - Parametric grid description
+    parser.add_argument('--descriptor', action='store_true',
+                        help='Save the parametric grid description '
+                             '(JSON).')
+    # - Chunked generation for very large grids
+    parser.add_argument('--chunk_size', type=int, default=None,
+                        help='Generate the grid in chunks of CHUNK_SIZE '
+                             'cells, dropping the cells outside the '
+                             'input polygons.')
+    parser.add_argument('--clip', action='store_true',
+                        help='Clip the cells crossing the input polygons '
+                             'boundary (with --chunk_size).')
+
+
+def run(args: argparse.Namespace) -> None:
+    """
+    Create grids within the polygons of the input file.
+    Args:
+        args: parsed command line arguments. See add_arguments.
+    """
+    os.makedirs(args.out_dir, exist_ok=True)
+    output_files = grid_from_area(args.input_file, args.out_dir,
+                                  buffer_dist=args.buffer_dist,
+                                  x_frame_split=args.x_frame_split,
+                                  y_frame_split=args.y_frame_split,
+                                  dissolve=args.dissolve,
+                                  descriptor=args.descriptor,
+                                  chunk_size=args.chunk_size,
+                                  clip=args.clip)
+    for output_file in output_files:
+        print(f"# - Grid saved to: {output_file}")
+
+
+def main() -> None:
+    """
+    Process a shapefile, create grids within polygons, and save the result
+    to separate shapefiles.
+    """
+    parser = argparse.ArgumentParser(
+        description="""Create a grid within each polygon of the
+        input file."""
+    )
+    add_arguments(parser)
+    run(parser.parse_args())
+
+
+# - run main program
+if __name__ == '__main__':
+    start_time = datetime.now()
+    main()
+    end_time = datetime.now()
+    print(f"# - Computation Time: {end_time - start_time}")
@@ -6,6 +6,10 @@ Set of Utilities to process a shapefile, create grids within polygons,
 and save the result.
 
 Python Dependencies
+numpy: The fundamental package for scientific computing with Python:
+    https://numpy.org
+pandas: Python Data Analysis Library:
+    https://pandas.pydata.org
 geopandas: Open source project to make working with geospatial data
     in python easier: https://geopandas.org
 pyproj: Python interface to PROJ (cartographic projections and coordinate
@@ -15,13 +19,17 @@ shapely: Python package for manipulation and analysis of planar geometric
     objects: https://shapely.readthedocs.io/en/stable/
 """
 import math
+import numpy as np
+import pandas as pd
 import geopandas as gpd
+import shapely
 from pyproj import CRS, Transformer
 from shapely.ops import transform
 from shapely.geometry import Polygon
 from shapely.affinity import rotate
 from math import ceil
 from typing import Tuple
+from grid_descriptor import GridDescriptor
 
 
 def add_frame_code_field(grid_gdf):
@@ -168,7 +176,36 @@ def rotate_polygon_to_north_up(geometry: Polygon) -> Tuple[Polygon, float]:
     return rotated_geometry, angle
 
 
-def create_grid_within_polygon(geometry, x_frame_split, y_frame_split):
+def fishnet_descriptor(xmin: float, ymin: float, xmax: float, ymax: float,
+                       gridWidth: float, gridHeight: float, angle: float,
+                       origin: tuple, crs: int = 3857) -> GridDescriptor:
+    """
+    Parametric description of the fishnet grid generated by
+    get_fishnet_grid and rotated by angle around origin.
+
+    Parameters:
+        xmin, ymin, xmax, ymax (float): Bounding box of the fishnet.
+        gridWidth (float): Width of each grid cell.
+        gridHeight (float): Height of each grid cell.
+        angle (float): Rotation angle (degrees).
+        origin (tuple): Rotation origin.
+        crs (int): EPSG code of the fishnet coordinates.
+
+    Returns:
+        GridDescriptor: Row 0 is the northernmost row of the fishnet.
+    """
+    rows = ceil((ymax - ymin) / gridHeight)
+    cols = ceil((xmax - xmin) / gridWidth)
+    x_lines = [xmin + i * gridWidth for i in range(cols + 1)]
+    return GridDescriptor(x_top=x_lines, y_top=[ymax] * (cols + 1),
+                          x_bottom=x_lines, y_bottom=[ymin] * (cols + 1),
+                          y0=ymax, dy=-gridHeight, n_rows=rows,
+                          angle=angle, origin=origin,
+                          crs=crs, work_crs=crs)
+
+
+def create_grid_within_polygon(geometry, x_frame_split, y_frame_split,
+                               return_descriptor=False):
     """
     Create a grid of polygons within the rotated bounding box of a polygon.
 
@@ -176,9 +213,13 @@ def create_grid_within_polygon(geometry, x_frame_split, y_frame_split):
         geometry (Polygon): Input polygon.
         x_frame_split (int): Number of columns in the grid.
         y_frame_split (int): Number of rows in the grid.
+        return_descriptor (bool, optional): Also return the parametric
+            description of the grid.
 
     Returns:
         grid_gdf (GeoDataFrame): GeoDataFrame containing the grid polygons.
+        descriptor (GridDescriptor): Parametric description of the grid
+            (if return_descriptor).
     """
     rotated_geometry, angle = rotate_polygon_to_north_up(geometry)
     min_x, min_y, max_x, max_y = rotated_geometry.bounds
@@ -198,23 +239,163 @@ def create_grid_within_polygon(geometry, x_frame_split, y_frame_split):
                           for geometry in grid_gdf['geometry']]
 
     grid_gdf['geometry'] = rotated_geometries
+    if return_descriptor:
+        descriptor = fishnet_descriptor(
+            min_x, min_y, max_x, max_y, gridWidth=x_spacing,
+            gridHeight=y_spacing, angle=angle,
+            origin=(rotated_geometry.centroid.x, rotated_geometry.centroid.y))
+        return grid_gdf, descriptor
+    return grid_gdf
+
+
+def grid_descriptor_within_polygon(geometry, x_frame_split, y_frame_split,
+                                   crs=3857):
+    """
+    Compute the parametric description of the grid generated by
+    create_grid_within_polygon without materializing its cells.
+
+    Parameters:
+        geometry (Polygon): Input polygon (EPSG:3857).
+        x_frame_split (int): Number of columns in the grid.
+        y_frame_split (int): Number of rows in the grid.
+        crs (int, optional): EPSG code of the materialized cells.
+
+    Returns:
+        descriptor (GridDescriptor): Parametric description of the grid.
+    """
+    rotated_geometry, angle = rotate_polygon_to_north_up(geometry)
+    min_x, min_y, max_x, max_y = rotated_geometry.bounds
+    descriptor = fishnet_descriptor(
+        min_x, min_y, max_x, max_y,
+        gridWidth=(max_x - min_x) / x_frame_split,
+        gridHeight=(max_y - min_y) / y_frame_split, angle=angle,
+        origin=(rotated_geometry.centroid.x, rotated_geometry.centroid.y))
+    descriptor.crs = crs
+    return descriptor
+
+
+def iter_grid_within_polygon(geometry, x_frame_split, y_frame_split,
+                             chunk_size=100_000, clip=False, crs=3857,
+                             descriptor=None):
+    """
+    Generate the grid of create_grid_within_polygon in chunks of cells,
+    dropping the cells outside the input polygon. Memory usage is
+    bounded by the chunk size regardless of the grid size.
+
+    NOTE: cells are generated row by row (north to south), while
+        create_grid_within_polygon lists them column by column.
+    Parameters:
+        geometry (Polygon): Input polygon (EPSG:3857).
+        x_frame_split (int): Number of columns in the grid.
+        y_frame_split (int): Number of rows in the grid.
+        chunk_size (int, optional): Approximate number of cells per chunk.
+        clip (bool, optional): Clip the cells crossing the polygon boundary.
+        crs (int, optional): EPSG code of the generated cells.
+        descriptor (GridDescriptor, optional): Grid description already
+            computed with grid_descriptor_within_polygon (same crs).
+
+    Returns:
+        Iterator of GeoDataFrames containing the grid cells.
+    """
+    if descriptor is None:
+        descriptor = grid_descriptor_within_polygon(
+            geometry, x_frame_split, y_frame_split, crs=crs)
+    if crs != 3857:
+        geometry = gpd.GeoSeries([geometry], crs=3857).to_crs(crs).iloc[0]
+    return descriptor.iter_cells(chunk_size=chunk_size, footprint=geometry,
+                                 clip=clip)
+
+
+def grid_centroid(input_gdf: gpd.GeoDataFrame,
+                  by: str | None = None) -> np.ndarray:
+    """
+    Compute the centroid of a grid as the area-weighted mean of the
+    centroids of its cells. For cells that do not overlap (a regular
+    lattice) it equals the centroid of their union, without computing
+    the union.
+
+    Parameters:
+        input_gdf (GeoDataFrame): Grid cells.
+        by (str, optional): Column identifying the grid of each cell.
+            Default: all the cells belong to a single grid.
+
+    Returns:
+        np.ndarray: (n_grids, 2) array of centroid coordinates, one row
+            per grid in order of first appearance.
+    """
+    if by is None:
+        codes = np.zeros(len(input_gdf), dtype=np.int64)
+    else:
+        codes = pd.factorize(input_gdf[by])[0]
+    cells = input_gdf.geometry.to_numpy()
+    area = shapely.area(cells)
+    xy = shapely.get_coordinates(shapely.centroid(cells))
+    n_grids = codes.max() + 1 if len(codes) else 0
+    w_area = np.bincount(codes, weights=area, minlength=n_grids)
+    return np.column_stack(
+        [np.bincount(codes, weights=area * xy[:, i], minlength=n_grids)
+         / w_area for i in range(2)])
+
+
+def translate_cells(input_gdf: gpd.GeoDataFrame,
+                    offsets: np.ndarray) -> gpd.GeoDataFrame:
+    """
+    Translate each cell of a GeoDataFrame by its own offset with a single
+    vectorized update of the coordinates.
+
+    Parameters:
+        input_gdf (GeoDataFrame): Grid cells.
+        offsets (np.ndarray): (n_cells, 2) array of x and y offsets.
+
+    Returns:
+        GeoDataFrame: Translated cells with the input attribute columns.
+    """
+    cells = input_gdf.geometry.to_numpy().copy()
+    coords, c_index = shapely.get_coordinates(cells, return_index=True)
+    cells = shapely.set_coordinates(cells, coords + offsets[c_index])
+    grid_gdf = input_gdf.copy()
+    grid_gdf[grid_gdf.geometry.name] = gpd.GeoSeries(
+        cells, index=input_gdf.index, crs=input_gdf.crs)
     return grid_gdf
 
 
+def align_grids(input_gdf: gpd.GeoDataFrame, references: dict,
+                by: str = 'grid_name') -> gpd.GeoDataFrame:
+    """
+    Translate a set of grids so that the centroid of each grid
+    matches its reference coordinates. All the cells are translated
+    at once; attribute columns, index and CRS are preserved.
+
+    Parameters:
+        input_gdf (GeoDataFrame): Cells of all the grids.
+        references (dict): {grid identifier: (x, y)} reference
+            coordinates. Grids without reference are not moved.
+        by (str, optional): Column identifying the grid of each cell.
+
+    Returns:
+        GeoDataFrame: Aligned grids.
+    """
+    codes, grid_ids = pd.factorize(input_gdf[by])
+    centroids = grid_centroid(input_gdf, by=by)
+    offsets = np.zeros((len(grid_ids), 2))
+    for i, grid_id in enumerate(grid_ids):
+        if grid_id in references:
+            offsets[i] = np.asarray(references[grid_id], dtype=float) \
+                - centroids[i]
+    return translate_cells(input_gdf, offsets[codes])
+
+
 def grid_gdf_shift(input_gdf: gpd.GeoDataFrame,
                    x_y_reference: tuple) -> gpd.GeoDataFrame:
-        """
-        Applies a shift on the dataframe based on centroid offset.
-        The offset is calculated from a tuple reference coordinates
-        and gdf centroid.
-        """
-        grid_gdf_dissolve = input_gdf.dissolve()
-        grid_centroid = (grid_gdf_dissolve["geometry"].centroid.x,
-                         grid_gdf_dissolve["geometry"].centroid.y)
-        centroid_x_offset = x_y_reference[0] - grid_centroid[0]
-        centroid_y_offset = x_y_reference[1] - grid_centroid[1]
-        grid_gdf = input_gdf.translate(xoff=float(centroid_x_offset),
-                                       yoff=float(centroid_y_offset))
-        grid_gdf = gpd.GeoDataFrame(geometry=gpd.GeoSeries(grid_gdf))
-
-        return grid_gdf
+    """
+    Applies a shift on the dataframe based on centroid offset.
+    The offset is calculated from a tuple reference coordinates
+    and gdf centroid (see grid_centroid). Attribute columns and CRS
+    are preserved. Use align_grids to shift several grids at once.
+    """
+    if input_gdf.empty:
+        return input_gdf.copy()
+    offset = np.asarray(x_y_reference, dtype=float) \
+        - grid_centroid(input_gdf)[0]
+    return translate_cells(input_gdf,
+                           np.broadcast_to(offset, (len(input_gdf), 2)))
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+u"""
+Cross-track overlap index of a set of along-track grids.
+
+The cells of all the grids are indexed with a single STRtree and the
+overlapping pairs are found with one bulk query. For each pair of cells
+belonging to different grids (adjacent paths, ascending/descending
+geometries) the index stores the fraction of the area of the first cell
+covered by the second one in a sparse matrix (scipy CSR format):
+
+    matrix[i, j] = area(cell_i & cell_j) / area(cell_i)
+
+The partners of a cell are read from the corresponding matrix row
+in constant time, without any spatial join.
+
+usage: overlap_index.py [-h] [--out_file OUT_FILE] grid_files [grid_files ...]
+
+positional arguments:
+  grid_files            Grid files (see mapitaly_at_grid.py). The grid name
+                        is the file name without extension.
+
+options:
+  -h, --help            show this help message and exit
+  --out_file OUT_FILE, -O OUT_FILE
+                        Output file [def. overlap_index.npz].
+
+Python Dependencies
+numpy: The fundamental package for scientific computing with Python:
+    https://numpy.org
+pandas: Python Data Analysis Library:
+    https://pandas.pydata.org
+geopandas: Open source project to make working with geospatial data
+    in python easier: https://geopandas.org
+scipy: Fundamental algorithms for scientific computing in Python:
+    https://scipy.org
+shapely: Python package for manipulation and analysis of planar geometric
+    objects: https://shapely.readthedocs.io/en/stable/
+"""
+import os
+import argparse
+from datetime import datetime
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from scipy import sparse
+# - Custom Dependencies
+from read_cached import read_cached
+
+
+class OverlapIndex:
+    """
+    Sparse index of the overlapping cells of a set of grids.
+    """
+    def __init__(self, grid_names: list[str], grid_code: np.ndarray,
+                 row: np.ndarray, col: np.ndarray,
+                 matrix: sparse.csr_matrix) -> None:
+        self.grid_names = list(grid_names)
+        self.grid_code = np.asarray(grid_code, dtype=np.int32)
+        self.row = np.asarray(row, dtype=np.int64)
+        self.col = np.asarray(col, dtype=np.int64)
+        self.matrix = sparse.csr_matrix(matrix)
+        if self.matrix.shape != (len(self), len(self)):
+            raise ValueError("Overlap matrix shape does not match "
+                             "the number of cells.")
+        self._cell_id = None
+
+    def __len__(self) -> int:
+        return len(self.grid_code)
+
+    def __repr__(self) -> str:
+        return (f"OverlapIndex(n_grids={len(self.grid_names)}, "
+                f"n_cells={len(self)}, n_pairs={self.matrix.nnz})")
+
+    # - Construction
+    @classmethod
+    def from_grids(cls, gdf_grids: gpd.GeoDataFrame,
+                   area_crs: str | int | None = None) -> 'OverlapIndex':
+        """
+        Build the overlap index of a set of grids.
+        Args:
+            gdf_grids: cells of all the grids with 'grid_name', 'row'
+                and 'col' columns (see mapitaly_pipeline.mapitaly_grids).
+            area_crs: projected CRS used to compute the intersection
+                areas. Default: the grids CRS if projected, otherwise
+                the UTM zone estimated from the grids.
+        Returns: OverlapIndex
+        """
+        if area_crs is None and gdf_grids.crs.is_geographic:
+            area_crs = gdf_grids.estimate_utm_crs()
+        if area_crs is not None:
+            gdf_grids = gdf_grids.to_crs(area_crs)
+        codes, grid_names = pd.factorize(gdf_grids['grid_name'])
+        cells = gdf_grids.geometry.to_numpy()
+        # - Bulk query of all the cells against all the cells
+        tree = shapely.STRtree(cells)
+        i_c, j_c = tree.query(cells, predicate='intersects')
+        # - Keep pairs of cells belonging to different grids
+        other = codes[i_c] != codes[j_c]
+        i_c, j_c = i_c[other], j_c[other]
+        area = shapely.area(shapely.intersection(cells[i_c], cells[j_c]))
+        # - Cells touching along a side do not overlap
+        valid = area > 0
+        i_c, j_c, area = i_c[valid], j_c[valid], area[valid]
+        fraction = area / shapely.area(cells)[i_c]
+        matrix = sparse.csr_matrix((fraction, (i_c, j_c)),
+                                   shape=(len(cells), len(cells)))
+        return cls(list(grid_names), codes, gdf_grids['row'].to_numpy(),
+                   gdf_grids['col'].to_numpy(), matrix)
+
+    # - Serialization
+    def save(self, out_file: str) -> None:
+        """Save the index to a compressed NumPy archive (.npz)."""
+        # - NumPy appends .npz to file names without this extension
+        tmp_file = f"{out_file}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(tmp_file,
+                            grid_names=np.asarray(self.grid_names, dtype=str),
+                            grid_code=self.grid_code, row=self.row,
+                            col=self.col, data=self.matrix.data,
+                            indices=self.matrix.indices,
+                            indptr=self.matrix.indptr)
+        os.replace(tmp_file, out_file)
+
+    @classmethod
+    def load(cls, in_file: str) -> 'OverlapIndex':
+        """Load an index saved with OverlapIndex.save."""
+        with np.load(in_file) as f_in:
+            n_cells = len(f_in['grid_code'])
+            matrix = sparse.csr_matrix((f_in['data'], f_in['indices'],
+                                        f_in['indptr']),
+                                       shape=(n_cells, n_cells))
+            return cls(f_in['grid_names'].tolist(), f_in['grid_code'],
+                       f_in['row'], f_in['col'], matrix)
+
+    # - Queries
+    def cell_id(self, grid_name: str, row: int, col: int) -> int:
+        """
+        Return the position of a cell in the index.
+        Raises KeyError if the cell is not indexed.
+        """
+        if self._cell_id is None:
+            self._cell_id = {(g, r, c): i for i, (g, r, c)
+                             in enumerate(zip(self.grid_code.tolist(),
+                                              self.row.tolist(),
+                                              self.col.tolist()))}
+        return self._cell_id[(self.grid_names.index(grid_name),
+                              int(row), int(col))]
+
+    def _cells(self, cell_ids: np.ndarray) -> pd.DataFrame:
+        """Identify a set of cells by grid name, row and column."""
+        return pd.DataFrame(
+            {'grid_name': np.asarray(self.grid_names,
+                                     dtype=object)[self.grid_code[cell_ids]],
+             'row': self.row[cell_ids], 'col': self.col[cell_ids]})
+
+    def partners(self, grid_name: str, row: int, col: int) -> pd.DataFrame:
+        """
+        Return the cells of the other grids overlapping a cell.
+        Args:
+            grid_name, row, col: cell identifier.
+        Returns: pd.DataFrame with 'grid_name', 'row', 'col' and
+            'fraction' (area fraction of the input cell covered
+            by the partner cell) columns.
+        """
+        cell_id = self.cell_id(grid_name, row, col)
+        start, stop = self.matrix.indptr[cell_id:cell_id + 2]
+        df_p = self._cells(self.matrix.indices[start:stop])
+        df_p['fraction'] = self.matrix.data[start:stop]
+        return df_p
+
+    def pairs(self, grid_a: str, grid_b: str) -> pd.DataFrame:
+        """
+        Return all the overlapping cells of two grids, e.g. the
+        ascending and descending grids to combine for the
+        vertical/east-west decomposition.
+        Args:
+            grid_a, grid_b: grid names.
+        Returns: pd.DataFrame with 'row_a', 'col_a', 'row_b', 'col_b',
+            'fraction_a' (area fraction of cell a covered by cell b)
+            and 'fraction_b' columns.
+        """
+        code_a = self.grid_names.index(grid_a)
+        code_b = self.grid_names.index(grid_b)
+        m_coo = self.matrix.tocoo()
+        sel = (self.grid_code[m_coo.row] == code_a) \
+            & (self.grid_code[m_coo.col] == code_b)
+        i_c, j_c = m_coo.row[sel], m_coo.col[sel]
+        return pd.DataFrame({'row_a': self.row[i_c], 'col_a': self.col[i_c],
+                             'row_b': self.row[j_c], 'col_b': self.col[j_c],
+                             'fraction_a': m_coo.data[sel],
+                             'fraction_b': np.asarray(
+                                 self.matrix[j_c, i_c]).ravel()})
+
+    def grid_overlaps(self) -> pd.DataFrame:
+        """
+        Summarize the overlap between grids.
+        Returns: pd.DataFrame with 'grid_a', 'grid_b', the number of
+            overlapping cell pairs 'n_pairs' and the overlapping area
+            expressed in number of cells of grid_a 'area_cells'.
+        """
+        m_coo = self.matrix.tocoo()
+        names = np.asarray(self.grid_names, dtype=object)
+        df_o = pd.DataFrame({'grid_a': names[self.grid_code[m_coo.row]],
+                             'grid_b': names[self.grid_code[m_coo.col]],
+                             'fraction': m_coo.data})
+        return df_o.groupby(['grid_a', 'grid_b']) \
+            .agg(n_pairs=('fraction', 'size'),
+                 area_cells=('fraction', 'sum')).reset_index()
+
+
+def read_grids(grid_files: list[str]) -> gpd.GeoDataFrame:
+    """
+    Read a set of grid files into a single GeoDataFrame.
+    The grid name is the file name without extension.
+    Args:
+        grid_files: Absolute Paths to the grid files.
+    Returns: gpd.GeoDataFrame
+    """
+    grid_list = []
+    for grid_file in grid_files:
+        gdf_grid = read_cached(grid_file, columns=['row', 'col'])
+        gdf_grid.insert(0, 'grid_name',
+                        os.path.splitext(os.path.basename(grid_file))[0])
+        if grid_list:
+            gdf_grid = gdf_grid.to_crs(grid_list[0].crs)
+        grid_list.append(gdf_grid)
+    return gpd.GeoDataFrame(pd.concat(grid_list, ignore_index=True),
+                            crs=grid_list[0].crs)
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Add the command line arguments of overlap_index to a parser.
+    """
+    parser.add_argument('grid_files', type=str, nargs='+',
+                        help='Grid files (see mapitaly_at_grid.py). The grid '
+                             'name is the file name without extension.')
+    parser.add_argument('--out_file', '-O', type=str,
+                        help='Output file [def. overlap_index.npz].',
+                        default=os.path.join(os.getcwd(),
+                                             'overlap_index.npz'))
+
+
+def run(args: argparse.Namespace) -> None:
+    """
+    Build the overlap index of the input grids.
+    Args:
+        args: parsed command line arguments. See add_arguments.
+    """
+    for grid_file in args.grid_files:
+        if not os.path.isfile(grid_file):
+            raise FileNotFoundError(f"File not found: {grid_file}")
+    index = OverlapIndex.from_grids(read_grids(args.grid_files))
+    index.save(args.out_file)
+    print(f"# - {index}")
+    print(f"# - Overlap index saved to: {args.out_file}")
+
+
+def main() -> None:
+    """
+    Build the cross-track overlap index of a set of along-track grids.
+    """
+    parser = argparse.ArgumentParser(
+        description="""Build the cross-track overlap index of a set
+        of along-track grids."""
+    )
+    add_arguments(parser)
+    run(parser.parse_args())
+
+
+# - run main program
+if __name__ == '__main__':
+    start_time = datetime.now()
+    main()
+    end_time = datetime.now()
+    print(f"# - Computation Time: {end_time - start_time}")
@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+u"""
+Columnar per-cell PS time-series cube.
+
+PS products carry one displacement column per acquisition date. After
+the distribution over the along-track grid (see distribute_ps_grid.py)
+the displacement series are stored as a dense (n_points x n_dates)
+float32 array:
+
+    - points are sorted by (grid_name, row, col), so that the points of
+      each grid cell occupy a contiguous range of the array;
+    - the array is split into chunks of whole cells, saved as the
+      record batches of a compressed Arrow IPC file (series.arrow)
+      together with the PS identifier and coordinates;
+    - cells.parquet maps each cell (grid_name, row, col) to its point
+      range [start, stop) and to the chunk containing it;
+    - cube.json stores the acquisition dates and the source columns.
+
+Per-cell time series are read from a single chunk as contiguous memory,
+and per-cell statistics are computed with vectorized reductions.
+
+Python Dependencies
+numpy: The fundamental package for scientific computing with Python:
+    https://numpy.org
+pandas: Python Data Analysis Library:
+    https://pandas.pydata.org
+pyarrow: Python library for Apache Arrow:
+    https://arrow.apache.org/docs/python/
+"""
+import os
+import re
+import json
+import shutil
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# - Displacement columns: acquisition date as YYYYMMDD (e.g. D20200101)
+DATE_PATTERN = r'^D?(\d{8})$'
+# - Cube files
+SERIES_FILE = 'series.arrow'
+CELLS_FILE = 'cells.parquet'
+META_FILE = 'cube.json'
+
+
+def date_columns(columns: list[str], pattern: str = DATE_PATTERN) \
+        -> tuple[list[str], np.ndarray]:
+    """
+    Find the displacement columns of a PS product.
+    Args:
+        columns: column names.
+        pattern: regular expression matching the displacement columns,
+            with the acquisition date (YYYYMMDD) as first group.
+    Returns: column names sorted by date and acquisition dates
+        (numpy datetime64[D]).
+    """
+    matches = [(c, m.group(1)) for c in columns
+               if (m := re.match(pattern, str(c)))]
+    matches.sort(key=lambda t: t[1])
+    dates = np.array([f"{d[:4]}-{d[4:6]}-{d[6:]}" for _, d in matches],
+                     dtype='datetime64[D]')
+    return [c for c, _ in matches], dates
+
+
+def write_ps_cube(gdf_ps: pd.DataFrame, out_dir: str,
+                  series_cols: list[str] | None = None,
+                  keys: tuple[str, ...] = ('grid_name', 'row', 'col'),
+                  id_col: str = 'id', cells_per_chunk: int = 64,
+                  compression: str = 'zstd') -> 'PSCube':
+    """
+    Save the displacement series of the distributed PS points to a cube.
+    Args:
+        gdf_ps: distributed PS points (see distribute_ps_grid.py).
+        out_dir: Absolute Path to the output cube directory. An existing
+            cube is replaced. Any other existing file or directory at
+            this path raises FileExistsError.
+        series_cols: displacement columns. Default: the columns matching
+            DATE_PATTERN.
+        keys: cell identifier columns (those not available are ignored).
+        id_col: PS unique identifier column (optional).
+        cells_per_chunk: number of cells per chunk.
+        compression: Arrow IPC compression (zstd, lz4 or None).
+    Returns: PSCube
+    """
+    if os.path.lexists(out_dir) \
+            and not os.path.isfile(os.path.join(out_dir, META_FILE)):
+        raise FileExistsError(f"Not a PS cube, not replaced: {out_dir}")
+    if series_cols is None:
+        series_cols, dates = date_columns(gdf_ps.columns)
+    else:
+        dates = date_columns(series_cols, pattern=r'^\D*(\d{8})')[1]
+    if not series_cols:
+        raise ValueError("No displacement columns found.")
+    keys = [k for k in keys if k in gdf_ps.columns]
+    gdf_ps = gdf_ps.sort_values(keys, kind='stable')
+    n_points = len(gdf_ps)
+    n_dates = len(series_cols)
+
+    # - Point range of each cell
+    df_key = gdf_ps[keys].reset_index(drop=True)
+    new_cell = np.ones(n_points, dtype=bool)
+    if n_points:
+        new_cell[1:] = (df_key.iloc[1:].to_numpy()
+                        != df_key.iloc[:-1].to_numpy()).any(axis=1)
+    start = np.flatnonzero(new_cell)
+    stop = np.append(start[1:], n_points)
+    df_cells = df_key.iloc[start].reset_index(drop=True)
+    df_cells['start'] = start
+    df_cells['stop'] = stop
+    df_cells['chunk'] = np.arange(len(start)) // cells_per_chunk
+
+    # - Record batches of whole cells
+    series = gdf_ps[series_cols].to_numpy(dtype=np.float32)
+    columns = {}
+    if id_col in gdf_ps.columns:
+        columns[id_col] = gdf_ps[id_col].to_numpy()
+    if 'geometry' in gdf_ps.columns:
+        columns['x'] = gdf_ps.geometry.x.to_numpy()
+        columns['y'] = gdf_ps.geometry.y.to_numpy()
+    tmp_dir = f"{out_dir}.{os.getpid()}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    options = pa.ipc.IpcWriteOptions(compression=compression)
+    schema = None
+    with pa.OSFile(os.path.join(tmp_dir, SERIES_FILE), 'wb') as f_out:
+        writer = None
+        chunk_start = df_cells.groupby('chunk')['start'].min().to_numpy()
+        chunk_stop = df_cells.groupby('chunk')['stop'].max().to_numpy()
+        for c_start, c_stop in zip(chunk_start, chunk_stop):
+            values = pa.array(series[c_start:c_stop].ravel())
+            arrays = {k: pa.array(v[c_start:c_stop])
+                      for k, v in columns.items()}
+            arrays['series'] = pa.FixedSizeListArray.from_arrays(values,
+                                                                 n_dates)
+            batch = pa.RecordBatch.from_pydict(arrays)
+            if writer is None:
+                schema = batch.schema
+                writer = pa.ipc.new_file(f_out, schema, options=options)
+            writer.write_batch(batch)
+        if writer is None:
+            schema = pa.schema([(k, pa.array(v[:0]).type)
+                                for k, v in columns.items()]
+                               + [('series', pa.list_(pa.float32(),
+                                                      n_dates))])
+            writer = pa.ipc.new_file(f_out, schema, options=options)
+        writer.close()
+    df_cells.to_parquet(os.path.join(tmp_dir, CELLS_FILE))
+    crs = getattr(gdf_ps, 'crs', None)
+    meta = {'dates': [str(d) for d in dates], 'columns': list(series_cols),
+            'keys': keys, 'n_points': n_points,
+            'crs': crs.to_string() if crs is not None else None}
+    with open(os.path.join(tmp_dir, META_FILE), 'w',
+              encoding='utf-8') as f_out:
+        json.dump(meta, f_out, indent=2)
+    # - Replace an existing cube
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    os.replace(tmp_dir, out_dir)
+    return PSCube(out_dir)
+
+
+class PSCube:
+    """
+    Reader of a PS time-series cube saved by write_ps_cube.
+    """
+    def __init__(self, cube_dir: str) -> None:
+        if not os.path.isdir(cube_dir):
+            raise FileNotFoundError(f"Cube not found: {cube_dir}")
+        self.cube_dir = cube_dir
+        with open(os.path.join(cube_dir, META_FILE),
+                  encoding='utf-8') as f_in:
+            meta = json.load(f_in)
+        self.dates = np.array(meta['dates'], dtype='datetime64[D]')
+        self.columns = meta['columns']
+        self.keys = meta['keys']
+        self.n_points = meta['n_points']
+        self.crs = meta['crs']
+        self.cells = pd.read_parquet(os.path.join(cube_dir, CELLS_FILE))
+        self._source = pa.memory_map(os.path.join(cube_dir, SERIES_FILE))
+        self._reader = pa.ipc.open_file(self._source)
+        self._chunk_start = self.cells.groupby('chunk')['start'].min() \
+            .to_numpy()
+        self._cell_id = {tuple(k): i for i, k in enumerate(
+            self.cells[self.keys].itertuples(index=False, name=None))}
+
+    def __repr__(self) -> str:
+        return (f"PSCube(n_points={self.n_points}, "
+                f"n_dates={len(self.dates)}, n_cells={len(self.cells)})")
+
+    def close(self) -> None:
+        """Close the memory mapped series file."""
+        self._source.close()
+
+    def __enter__(self) -> 'PSCube':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    @property
+    def n_chunks(self) -> int:
+        return self._reader.num_record_batches
+
+    def read_chunk(self, chunk: int) -> tuple[pd.DataFrame, np.ndarray]:
+        """
+        Read a chunk of the cube.
+        Returns: PS attributes (id, x, y) and displacement series
+            (n_points x n_dates float32 array).
+        """
+        batch = self._reader.get_batch(chunk)
+        series = batch.column('series').flatten().to_numpy() \
+            .reshape(len(batch), len(self.dates))
+        return batch.drop_columns(['series']).to_pandas(), series
+
+    def cell_range(self, *key) -> tuple[int, int]:
+        """Return the point range [start, stop) of a cell."""
+        cell = self.cells.iloc[self._cell_id[tuple(key)]]
+        return int(cell['start']), int(cell['stop'])
+
+    def read_cell(self, *key) -> tuple[pd.DataFrame, np.ndarray]:
+        """
+        Read the PS points of a cell.
+        Args:
+            key: cell identifier, e.g. (grid_name, row, col).
+        Returns: see read_chunk.
+        """
+        cell = self.cells.iloc[self._cell_id[tuple(key)]]
+        df_pts, series = self.read_chunk(int(cell['chunk']))
+        offset = self._chunk_start[int(cell['chunk'])]
+        c_slice = slice(int(cell['start']) - offset,
+                        int(cell['stop']) - offset)
+        return df_pts.iloc[c_slice].reset_index(drop=True), series[c_slice]
+
+    def cell_means(self) -> np.ndarray:
+        """
+        Compute the mean displacement series of all the cells.
+        Returns: (n_cells x n_dates) float32 array, rows ordered as
+            the cells table.
+        """
+        means = np.empty((len(self.cells), len(self.dates)),
+                         dtype=np.float32)
+        for chunk, df_c in self.cells.groupby('chunk'):
+            series = self.read_chunk(int(chunk))[1]
+            offset = self._chunk_start[int(chunk)]
+            bounds = df_c['start'].to_numpy() - offset
+            valid = ~np.isnan(series)
+            sums = np.add.reduceat(np.where(valid, series, 0), bounds,
+                                   axis=0)
+            counts = np.add.reduceat(valid, bounds, axis=0)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                means[df_c.index.to_numpy()] = sums / counts
+        return means
+
+    def velocity(self, series: np.ndarray) -> np.ndarray:
+        """
+        Fit a linear trend to displacement series.
+        Args:
+            series: (n x n_dates) displacement array (NaN = no data).
+        Returns: velocity in displacement units per year.
+        """
+        t_yr = (self.dates - self.dates[0]).astype(float) / 365.25
+        valid = ~np.isnan(series)
+        n_obs = valid.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            t_mean = (valid * t_yr).sum(axis=1) / n_obs
+            y_mean = np.where(valid, series, 0).sum(axis=1) / n_obs
+            d_t = np.where(valid, t_yr - t_mean[:, np.newaxis], 0)
+            d_y = np.where(valid, series - y_mean[:, np.newaxis], 0)
+            return (d_t * d_y).sum(axis=1) / (d_t ** 2).sum(axis=1)
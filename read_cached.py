@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+u"""
+Read-through GeoParquet cache for vector data sources.
+
+On first read a source (ESRI shapefile with its sidecar files, zipped
+shapefile, GeoPackage, ...) is converted to a GeoParquet file stored in a
+cache directory, together with a JSON fingerprint of the source files
+(absolute path, modification time, size and SHA-256 hash). Later reads
+load the GeoParquet file using memory mapping and, optionally, only a
+subset of its columns. The cache is rebuilt automatically when the
+source changes.
+
+The GeoParquet file is split into row groups of ROW_GROUP_SIZE features,
+so that it can be loaded as several Dask partitions (one per row group).
+
+The cache directory defaults to the user cache directory
+($XDG_CACHE_HOME/iride or ~/.cache/iride), writable also when the
+sources are stored in a read-only archive. It can be redirected with
+the IRIDE_CACHE_DIR environment variable.
+Cache files are named after the source file name and a hash of its
+absolute path: sources with the same name in different directories
+can share the same cache directory.
+
+Python Dependencies
+geopandas: Open source project to make working with geospatial data
+    in python easier: https://geopandas.org
+pyarrow: Python library for Apache Arrow:
+    https://arrow.apache.org/docs/python/
+"""
+import os
+import json
+import hashlib
+import geopandas as gpd
+
+# - Shapefile sidecar files contributing to the cached content
+SHP_SIDECARS = ('.shp', '.shx', '.dbf', '.prj', '.cpg')
+# - GeoParquet cache: features per row group
+ROW_GROUP_SIZE = 100_000
+
+
+def source_files(path: str) -> list[str]:
+    """
+    List the files making up a vector data source.
+    Args:
+        path: Absolute Path to the data source.
+    Returns: list of existing files.
+    """
+    base, ext = os.path.splitext(path)
+    if ext.lower() == '.shp':
+        return [base + sfx for sfx in SHP_SIDECARS
+                if os.path.isfile(base + sfx)]
+    return [path]
+
+
+def file_hash(path: str, block_size: int = 2**20) -> str:
+    """Return the SHA-256 hash of a file."""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f_in:
+        for block in iter(lambda: f_in.read(block_size), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def source_fingerprint(path: str) -> dict:
+    """
+    Compute the fingerprint of a vector data source.
+    Args:
+        path: Absolute Path to the data source.
+    Returns: dictionary {file name: {mtime, size, sha256}}.
+    """
+    fingerprint = {}
+    for f_name in source_files(path):
+        f_stat = os.stat(f_name)
+        fingerprint[os.path.basename(f_name)] \
+            = {'mtime': f_stat.st_mtime_ns, 'size': f_stat.st_size,
+               'sha256': file_hash(f_name)}
+    return fingerprint
+
+
+def _fingerprint_is_valid(path: str, cache_info: dict) -> bool | None:
+    """
+    Validate a stored fingerprint against the current source.
+    Args:
+        path: Absolute Path to the data source.
+        cache_info: stored cache information {source, fingerprint}.
+    Returns: True if modification time and size of every file match,
+        None if they do not match but the content hash does,
+        False otherwise (or if the cache belongs to another source).
+    """
+    if cache_info.get('source') != os.path.abspath(path):
+        return False
+    fingerprint = cache_info.get('fingerprint', {})
+    files = source_files(path)
+    if sorted(os.path.basename(f) for f in files) != sorted(fingerprint):
+        return False
+    stat_match = True
+    for f_name in files:
+        f_stat = os.stat(f_name)
+        f_ref = fingerprint[os.path.basename(f_name)]
+        if f_stat.st_size != f_ref['size']:
+            return False
+        if f_stat.st_mtime_ns != f_ref['mtime']:
+            stat_match = False
+    if stat_match:
+        return True
+    # - Source touched but possibly unchanged. Compare hashes.
+    for f_name in files:
+        f_ref = fingerprint[os.path.basename(f_name)]
+        if file_hash(f_name) != f_ref['sha256']:
+            return False
+    return None
+
+
+def _cache_info(path: str) -> dict:
+    """Cache information stored next to the GeoParquet file."""
+    return {'source': os.path.abspath(path),
+            'fingerprint': source_fingerprint(path)}
+
+
+def cache_name(path: str) -> str:
+    """
+    Name of the cache files of a data source: source file name
+    followed by a hash of its absolute path.
+    """
+    path_hash = hashlib.sha256(os.path.abspath(path).encode('utf-8'))
+    return f"{os.path.basename(path)}.{path_hash.hexdigest()[:16]}"
+
+
+def _write_json(out_file: str, data: dict) -> None:
+    """Atomically write a dictionary to a JSON file."""
+    tmp_file = f"{out_file}.{os.getpid()}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f_out:
+        json.dump(data, f_out, indent=2)
+    os.replace(tmp_file, out_file)
+
+
+def default_cache_dir() -> str:
+    """
+    Return the default cache directory: IRIDE_CACHE_DIR if set,
+    otherwise the 'iride' directory in the user cache directory.
+    """
+    if 'IRIDE_CACHE_DIR' in os.environ:
+        return os.environ['IRIDE_CACHE_DIR']
+    return os.path.join(os.environ.get('XDG_CACHE_HOME',
+                                       os.path.expanduser('~/.cache')),
+                        'iride')
+
+
+def cached_parquet(path: str, cache_dir: str | None = None) -> str:
+    """
+    Return the path to an up-to-date GeoParquet copy of a data source,
+    converting the source if needed.
+    Args:
+        path: Absolute Path to the data source.
+        cache_dir: Cache directory. Default: see default_cache_dir.
+    Returns: Absolute Path to the cached GeoParquet file.
+    """
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"File not found: {path}")
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+    c_name = cache_name(path)
+    cache_file = os.path.join(cache_dir, c_name + '.parquet')
+    fprint_file = os.path.join(cache_dir, c_name + '.json')
+
+    if os.path.isfile(cache_file) and os.path.isfile(fprint_file):
+        with open(fprint_file, encoding='utf-8') as f_in:
+            cache_info = json.load(f_in)
+        valid = _fingerprint_is_valid(path, cache_info)
+        if valid:
+            return cache_file
+        if valid is None:
+            # - Content unchanged, refresh modification times
+            _write_json(fprint_file, _cache_info(path))
+            return cache_file
+
+    # - (Re)build the cache
+    cache_info = _cache_info(path)
+    gdf = gpd.read_file(path)
+    # - Process-specific temporary file: concurrent workers may
+    # - build the same cache.
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    gdf.to_parquet(tmp_file, compression='zstd',
+                   row_group_size=ROW_GROUP_SIZE)
+    os.replace(tmp_file, cache_file)
+    _write_json(fprint_file, cache_info)
+    return cache_file
+
+
+def read_cached(path: str, columns: list[str] | None = None,
+                cache_dir: str | None = None) -> gpd.GeoDataFrame:
+    """
+    Read a vector data source through the GeoParquet cache.
+    If the cache cannot be written (e.g. read-only file system),
+    the source is read directly.
+    Args:
+        path: Absolute Path to the data source.
+        columns: Subset of attribute columns to load. The geometry
+            column is always loaded.
+        cache_dir: Cache directory. See cached_parquet.
+    Returns: gpd.GeoDataFrame
+    """
+    try:
+        cache_file = cached_parquet(path, cache_dir=cache_dir)
+    except OSError as err:
+        if not os.path.isfile(path):
+            raise
+        print(f"# - Cache not available ({err}). Reading: {path}")
+        gdf = gpd.read_file(path)
+        return gdf if columns is None \
+            else gdf[[c for c in columns if c != 'geometry'] + ['geometry']]
+    if columns is not None:
+        columns = [c for c in columns if c != 'geometry'] + ['geometry']
+    return gpd.read_parquet(cache_file, columns=columns, memory_map=True)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+""" Shared fixtures for the unit tests. """
+import os
+import pytest
+import geopandas as gpd
+from shapely.geometry import Polygon
+from shapely.affinity import translate
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path_factory, monkeypatch):
+    """Keep the GeoParquet cache of the tests in a temporary directory."""
+    cache_dir = str(tmp_path_factory.getbasetemp() / 'iride_cache')
+    monkeypatch.setenv('IRIDE_CACHE_DIR', cache_dir)
+    return cache_dir
+
+
+@pytest.fixture
+def frames_file(tmp_path):
+    """
+    Return a MapItaly-like frames file with two overlapping tracks
+    covering the PS sample: the footprint of the grid_CSG2_151 cells
+    around the sample (ascending) and a copy shifted to the east
+    (descending).
+    The corners are moved to obtain a trapezoid as for the actual frames.
+    """
+    grid_file \
+        = os.path.join('.', 'data', 'shapefiles',
+                       'grid_CSG2_151_STR-007_ASC.shp')
+    gdf_grid = gpd.read_file(grid_file)
+    # - Grid rows covering the PS sample
+    gdf_grid = gdf_grid.cx[15.7:16.6, 38.7:39.5]
+    footprint = gdf_grid.union_all().minimum_rotated_rectangle
+    corners = list(footprint.exterior.coords)[:-1]
+    corners = [(x + dx, y) for (x, y), dx
+               in zip(corners, [0.01, -0.02, 0.015, -0.01])]
+    footprint = Polygon(corners)
+    gdf = gpd.GeoDataFrame(
+        {'Path': [151, 152], 'SensorMode': ['STR-007', 'STR-007'],
+         'Pass': ['ASCENDING', 'DESCENDING'],
+         'Satellite': ['COSMO-SkyMed-SG-2', 'COSMO-SkyMed-SG-2']},
+        geometry=[footprint, translate(footprint, xoff=0.1)],
+        crs='EPSG:4326')
+    out_file = str(tmp_path / 'mapitaly_frames.shp')
+    gdf.to_file(out_file)
+    return out_file
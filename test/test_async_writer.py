@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+""" Unit tests for the async_writer module. """
+import os
+import time
+import threading
+import pytest
+import geopandas as gpd
+from shapely.geometry import Point
+import async_writer
+from async_writer import AsyncWriter, ChunkedOutput, geoparquet_table
+
+
+def sample_chunk(start: int, n_pts: int) -> gpd.GeoDataFrame:
+    return gpd.GeoDataFrame(
+        {'id': range(start, start + n_pts)},
+        geometry=[Point(12 + i * 1e-3, 42) for i in range(n_pts)],
+        crs='EPSG:4326', index=range(n_pts))
+
+
+def test_async_writer_order_and_back_pressure():
+    written = []
+    pending = []
+    release = threading.Event()
+
+    def slow_write(value):
+        release.wait()
+        written.append(value)
+
+    writer = AsyncWriter(max_pending=1)
+    writer.submit(slow_write, 0)      # - picked up by the I/O thread
+    writer.submit(slow_write, 1)      # - fills the queue
+    # - The next submit blocks until the I/O thread catches up
+    blocked = threading.Thread(
+        target=lambda: (writer.submit(slow_write, 2), pending.append(2)))
+    blocked.start()
+    time.sleep(0.2)
+    assert not pending
+    release.set()
+    blocked.join()
+    writer.close()
+    assert written == [0, 1, 2]
+
+
+def test_async_writer_error_propagation():
+    def fail():
+        raise OSError("disk full")
+
+    written = []
+    with pytest.raises(RuntimeError) as err:
+        with AsyncWriter() as writer:
+            writer.submit(fail)
+            writer.flush()
+    assert isinstance(err.value.__cause__, OSError)
+    # - Writes queued after a failure are skipped
+    writer = AsyncWriter()
+    writer.submit(fail)
+    with pytest.raises(RuntimeError):
+        for i in range(100):
+            writer.submit(written.append, i)
+            time.sleep(0.01)
+    with pytest.raises(RuntimeError):
+        writer.close()
+    assert not written
+
+
+@pytest.mark.parametrize('ext', ['parquet', 'shp'])
+def test_chunked_output(tmp_path, ext):
+    out_file = str(tmp_path / f'ps_rc.{ext}')
+    output = ChunkedOutput(out_file)
+    with AsyncWriter() as writer:
+        for start in (0, 10, 20):
+            writer.submit(output.write, sample_chunk(start, 10))
+        writer.submit(output.close)
+    assert not [f for f in os.listdir(tmp_path) if '_tmp' in f]
+    gdf = gpd.read_parquet(out_file) if ext == 'parquet' \
+        else gpd.read_file(out_file)
+    assert output.n_rows == len(gdf) == 30
+    assert list(gdf['id']) == list(range(30))
+    assert gdf.crs == 'EPSG:4326'
+
+
+def test_geoparquet_table_fallback(monkeypatch):
+    gdf = sample_chunk(0, 10)
+    table = geoparquet_table(gdf, write_covering_bbox=True)
+    # - Public to_parquet path
+    monkeypatch.setattr(async_writer, '_geopandas_to_arrow', None)
+    table_pub = geoparquet_table(gdf, write_covering_bbox=True)
+    assert table_pub.equals(table)
+    assert b'geo' in table_pub.schema.metadata
+    assert 'bbox' in table_pub.column_names
+
+
+@pytest.mark.parametrize('ext', ['parquet', 'shp'])
+def test_chunked_output_abort(tmp_path, ext):
+    out_file = str(tmp_path / f'ps_rc.{ext}')
+    with ChunkedOutput(out_file) as output:
+        output.write(sample_chunk(0, 5))
+    # - Failure after the first chunk: the previous output is kept
+    with pytest.raises(ValueError):
+        with ChunkedOutput(out_file) as output:
+            output.write(sample_chunk(0, 10))
+            raise ValueError("chunk failed")
+    assert not [f for f in os.listdir(tmp_path) if '_tmp' in f]
+    gdf = gpd.read_parquet(out_file) if ext == 'parquet' \
+        else gpd.read_file(out_file)
+    assert len(gdf) == 5
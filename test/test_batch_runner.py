@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+""" Unit tests for the batch_runner module. """
+import os
+import pytest
+import yaml
+import geopandas as gpd
+from batch_runner import load_run_spec, run_batch
+
+
+def write_spec(tmp_path, frames_file, executor='serial', **kwargs):
+    """Write a run specification covering the PS sample."""
+    ps_file \
+        = os.path.abspath(os.path.join(
+            '.', 'data', 'shapefiles',
+            'csk_ps_sample_Nocera_Terinese_A_epsg4326.shp'))
+    spec = {'frames_file': frames_file, 'out_dir': 'run',
+            'grid': {'n_c': 3, 'az_res': 5e3, 'buffer_dist': 1e3},
+            'aois': [{'name': 'NOC_A', 'ps_file': ps_file}],
+            'executor': {'type': executor, 'workers': 2}, **kwargs}
+    spec_file = tmp_path / 'run_spec.yaml'
+    spec_file.write_text(yaml.safe_dump(spec))
+    return str(spec_file)
+
+
+def test_load_run_spec(tmp_path, frames_file):
+    spec = load_run_spec(write_spec(tmp_path, frames_file))
+    assert spec['out_dir'] == str(tmp_path / 'run')
+    assert spec['out_format'] == 'parquet'
+    with pytest.raises(ValueError):
+        load_run_spec(write_spec(tmp_path, frames_file, executor='mpi'))
+
+
+@pytest.mark.parametrize('executor', ['serial', 'process'])
+def test_run_batch(tmp_path, frames_file, executor):
+    spec_file = write_spec(tmp_path, frames_file, executor=executor)
+    status = run_batch(spec_file)
+    assert len(status['done']) == 4
+    assert not status['failed'] and not status['skipped']
+    out_file = (tmp_path / 'run' / 'NOC_A'
+                / 'csk_ps_sample_Nocera_Terinese_A_epsg4326_'
+                  'grid_CSG2_151_STR-007_ASC_rc.parquet')
+    assert len(gpd.read_parquet(out_file)) > 0
+
+    # - Rerun: all tasks are skipped
+    status = run_batch(spec_file)
+    assert len(status['skipped']) == 4 and not status['done']
+
+    # - Lost output: only the relative task is run again
+    os.remove(out_file)
+    status = run_batch(spec_file)
+    assert status['done'] == ['NOC_A_grid_CSG2_151_STR-007_ASC']
+
+
+def test_run_batch_new_parameters(tmp_path, frames_file):
+    run_batch(write_spec(tmp_path, frames_file))
+    # - New grid parameters invalidate grids and PS distributions
+    status = run_batch(write_spec(tmp_path, frames_file,
+                                  grid={'n_c': 4, 'az_res': 5e3}))
+    assert len(status['done']) == 4
+
+
+def test_run_batch_new_input(tmp_path, frames_file):
+    ps_file = str(tmp_path / 'ps.shp')
+    gdf_ps = gpd.read_file(os.path.join(
+        '.', 'data', 'shapefiles',
+        'csk_ps_sample_Nocera_Terinese_A_epsg4326.shp'))
+    gdf_ps.to_file(ps_file)
+    spec_file = write_spec(tmp_path, frames_file,
+                           aois=[{'name': 'NOC_A', 'ps_file': ps_file}])
+    run_batch(spec_file)
+    # - Touched but unchanged input: all tasks are skipped
+    os.utime(ps_file)
+    assert len(run_batch(spec_file)['skipped']) == 4
+    # - New PS points: the PS distributions are run again
+    gdf_ps.iloc[:100].to_file(ps_file)
+    status = run_batch(spec_file)
+    assert sorted(status['done']) == ['NOC_A_grid_CSG2_151_STR-007_ASC',
+                                      'NOC_A_grid_CSG2_152_STR-007_DES']
+    out_file = (tmp_path / 'run' / 'NOC_A'
+                / 'ps_grid_CSG2_151_STR-007_ASC_rc.parquet')
+    assert len(gpd.read_parquet(out_file)) <= 100
+
+
+def test_run_batch_failed_regrid(tmp_path, frames_file, monkeypatch):
+    run_batch(write_spec(tmp_path, frames_file))
+    spec_file = write_spec(tmp_path, frames_file,
+                           grid={'n_c': 4, 'az_res': 5e3,
+                                 'buffer_dist': 1e3})
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("grid failed")
+
+    # - Failed grids: no PS distribution on the grids of the previous run
+    monkeypatch.setattr('batch_runner.generate_grid', fail)
+    status = run_batch(spec_file)
+    assert len(status['failed']) == 2 and not status['done']
+    monkeypatch.undo()
+    # - Grids and PS distributions run again
+    status = run_batch(spec_file)
+    assert len(status['done']) == 4
+    out_file = (tmp_path / 'run' / 'NOC_A'
+                / 'csk_ps_sample_Nocera_Terinese_A_epsg4326_'
+                  'grid_CSG2_151_STR-007_ASC_rc.parquet')
+    assert set(gpd.read_parquet(out_file)['col']) == {0, 1, 2, 3}
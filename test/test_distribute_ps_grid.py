@@ -4,8 +4,16 @@
 import os
 import pytest
 import time
+import pandas as pd
+import geopandas as gpd
 import dask_geopandas as dgpd
-from distribute_ps_grid import distribute_ps_grid
+import pyarrow.parquet as pq
+from read_cached import read_cached
+from async_writer import geoparquet_table
+from iride_cli import main
+from distribute_ps_grid import (distribute_ps_grid, update_ps_grid,
+                                save_ps_output, read_ps_output,
+                                save_ps_partitions)
 
 
 def test_distribute_ps_grid():
@@ -23,6 +31,7 @@ def test_distribute_ps_grid():
 
     # Assertions based on your expected results
     assert isinstance(result, dgpd.GeoDataFrame)
+    assert result.npartitions > 1
 
 
 def test_invalid_files():
@@ -49,3 +58,160 @@ def test_large_dataset_performance():
 
     # Set a reasonable threshold based on your performance expectations
     assert end_time - start_time < 1    # seconds
+
+
+@pytest.mark.parametrize('ext', ['parquet', 'shp'])
+def test_update_ps_grid(tmp_path, ext):
+    # - import sample data
+    input_file \
+        = os.path.join('.', 'data', 'shapefiles',
+                       'csk_ps_sample_Nocera_Terinese_A_epsg4326.shp')
+    # - Import CSK Along Track Grid
+    grid_file \
+        = os.path.join('.', 'data', 'shapefiles',
+                       'grid_CSG2_151_STR-007_ASC.shp')
+    # - Previous run on the full dataset
+    previous_file = str(tmp_path / f'ps_rc.{ext}')
+    gdf_full = distribute_ps_grid(input_file, grid_file).compute()
+    save_ps_output(gdf_full.reset_index(drop=True), previous_file)
+
+    # - New processing run: one point moved, one removed, one added
+    gdf_ps = gpd.read_file(input_file)
+    in_grid = gdf_full['id'].to_numpy()
+    gdf_ps.loc[gdf_ps['id'] == in_grid[0], 'geometry'] \
+        = gdf_full.geometry.iloc[1]
+    gdf_ps = gdf_ps[gdf_ps['id'] != in_grid[2]]
+    new_pt = gdf_ps.iloc[[0]].copy()
+    new_pt['id'] = gdf_ps['id'].max() + 1
+    new_pt['geometry'] = gdf_full.geometry.iloc[3]
+    gdf_ps = pd.concat([gdf_ps, new_pt]).reset_index(drop=True)
+    new_input = str(tmp_path / 'ps_new.shp')
+    gdf_ps.to_file(new_input)
+
+    # - Incremental run vs. full run
+    result = update_ps_grid(new_input, grid_file, previous_file)
+    expected = distribute_ps_grid(new_input, grid_file).compute()
+    result = result.sort_values('id').reset_index(drop=True)
+    expected = expected.sort_values('id').reset_index(drop=True)
+    assert len(result) == len(gdf_full)
+    assert result[['id', 'row', 'col']].equals(
+        expected[['id', 'row', 'col']])
+
+
+@pytest.mark.parametrize('streamed', [False, True])
+def test_sorted_ps_output(tmp_path, monkeypatch, streamed):
+    input_file \
+        = os.path.join('.', 'data', 'shapefiles',
+                       'csk_ps_sample_Nocera_Terinese_A_epsg4326.shp')
+    grid_file \
+        = os.path.join('.', 'data', 'shapefiles',
+                       'grid_CSG2_151_STR-007_ASC.shp')
+    monkeypatch.setattr('distribute_ps_grid.ROW_GROUP_SIZE', 500)
+    out_file = str(tmp_path
+                   / 'csk_ps_sample_Nocera_Terinese_A_epsg4326_rc.parquet')
+    if streamed:
+        main(['distribute', input_file, grid_file, '-O', str(tmp_path)])
+    else:
+        gdf_smp = distribute_ps_grid(input_file, grid_file).compute()
+        save_ps_output(gdf_smp, out_file)
+    gdf_out = read_ps_output(out_file)
+    # - Points sorted by grid cell
+    keys = list(zip(gdf_out['row'], gdf_out['col']))
+    assert keys == sorted(keys)
+    # - Row groups with bounding box covering and row/col statistics
+    pq_file = pq.ParquetFile(out_file)
+    assert pq_file.metadata.num_row_groups >= len(gdf_out) // 500
+    assert b'covering' in pq_file.schema_arrow.metadata[b'geo']
+    rg_stats = pq_file.metadata.row_group(0).column(
+        pq_file.schema_arrow.get_field_index('row')).statistics
+    assert rg_stats.has_min_max
+    # - Filtered reads
+    row, col = keys[len(keys) // 2]
+    gdf_cell = read_ps_output(out_file, cell=(row, col))
+    assert len(gdf_cell) == keys.count((row, col))
+    bbox = gdf_cell.total_bounds
+    gdf_bbox = read_ps_output(out_file, bbox=tuple(bbox))
+    assert set(gdf_cell['id']) <= set(gdf_bbox['id'])
+    assert 'bbox' not in gdf_bbox.columns
+
+
+@pytest.mark.parametrize('out_format', ['parquet', 'shp'])
+def test_save_ps_partitions(tmp_path, out_format):
+    input_file \
+        = os.path.join('.', 'data', 'shapefiles',
+                       'csk_ps_sample_Nocera_Terinese_A_epsg4326.shp')
+    grid_file \
+        = os.path.join('.', 'data', 'shapefiles',
+                       'grid_CSG2_151_STR-007_ASC.shp')
+    gdf_smp = distribute_ps_grid(input_file, grid_file).compute() \
+        .reset_index(drop=True)
+    # - Multi-partition input: distributed sort of the parquet output
+    dgdf_smp = dgpd.from_geopandas(gdf_smp, npartitions=3)
+    out_file = str(tmp_path / f'ps_rc.{out_format}')
+    save_ps_partitions(dgdf_smp, out_file, batch_size=2)
+    gdf_out = read_ps_output(out_file)
+    assert sorted(gdf_out['id']) == sorted(gdf_smp['id'])
+    assert gdf_out.crs == gdf_smp.crs
+    if out_format == 'parquet':
+        keys = list(zip(gdf_out['row'], gdf_out['col']))
+        assert keys == sorted(keys)
+        # - Temporary buckets removed
+        assert os.listdir(tmp_path) == ['ps_rc.parquet']
+
+
+def test_distribute_row_groups(tmp_path, monkeypatch):
+    # - Cache written in several row groups: one partition per row group
+    input_file \
+        = os.path.join('.', 'data', 'shapefiles',
+                       'csk_ps_sample_Nocera_Terinese_A_epsg4326.shp')
+    grid_file \
+        = os.path.join('.', 'data', 'shapefiles',
+                       'grid_CSG2_151_STR-007_ASC.shp')
+    monkeypatch.setenv('IRIDE_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr('read_cached.ROW_GROUP_SIZE', 400)
+    result = distribute_ps_grid(input_file, grid_file, npartitions=1)
+    assert result.npartitions == 13
+    expected = gpd.read_file(input_file).sjoin(
+        read_cached(grid_file), how='inner', predicate='within')
+    assert sorted(result.compute()['id']) == sorted(expected['id'])
+
+
+def test_save_ps_partitions_failure(tmp_path, monkeypatch):
+    input_file \
+        = os.path.join('.', 'data', 'shapefiles',
+                       'csk_ps_sample_Nocera_Terinese_A_epsg4326.shp')
+    grid_file \
+        = os.path.join('.', 'data', 'shapefiles',
+                       'grid_CSG2_151_STR-007_ASC.shp')
+    gdf_smp = distribute_ps_grid(input_file, grid_file).compute()
+    dgdf_smp = dgpd.from_geopandas(gdf_smp, npartitions=3)
+    calls = []
+
+    def failing_table(gdf, **kwargs):
+        calls.append(len(gdf))
+        if len(calls) > 1:
+            raise OSError("disk full")
+        return geoparquet_table(gdf, **kwargs)
+
+    monkeypatch.setattr('async_writer.geoparquet_table', failing_table)
+    with pytest.raises(RuntimeError):
+        save_ps_partitions(dgdf_smp, str(tmp_path / 'ps_rc.parquet'),
+                           batch_size=1)
+    # - Partial output discarded
+    assert not os.listdir(tmp_path)
+
+
+def test_distribute_without_cache(tmp_path, monkeypatch):
+    # - Cache directory cannot be created: read the source
+    input_file \
+        = os.path.join('.', 'data', 'shapefiles',
+                       'csk_ps_sample_Nocera_Terinese_A_epsg4326.shp')
+    grid_file \
+        = os.path.join('.', 'data', 'shapefiles',
+                       'grid_CSG2_151_STR-007_ASC.shp')
+    not_a_dir = tmp_path / 'file'
+    not_a_dir.write_text('')
+    monkeypatch.setenv('IRIDE_CACHE_DIR', str(not_a_dir / 'cache'))
+    result = distribute_ps_grid(input_file, grid_file)
+    assert result.npartitions == 4
+    assert len(result.compute()) > 0
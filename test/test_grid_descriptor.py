@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+""" Unit tests for the GridDescriptor class. """
+import os
+import numpy as np
+import geopandas as gpd
+from shapely.geometry import Polygon, box
+from generate_grid import generate_grid
+from grid_descriptor import GridDescriptor, write_cell_chunks
+from mita_csk_frame_grid_utils import (create_grid_within_polygon,
+                                       iter_grid_within_polygon)
+
+
+def track_gdf() -> gpd.GeoDataFrame:
+    d = {'index': 1,
+         'geometry': Polygon([(12, 36), (11.5, 38), (14, 38.5),
+                              (14, 36.5), (12, 36)])}
+    return gpd.GeoDataFrame(d, crs='EPSG:4326', index=[0])
+
+
+def test_descriptor_matches_grid():
+    grid_gdf, descriptor = generate_grid(track_gdf(), 3, 5000, 1000,
+                                         return_descriptor=True)
+    assert len(descriptor) == len(grid_gdf)
+    assert descriptor.shape == (grid_gdf['row'].max() + 1, 3)
+    # - Single cell
+    row, col = grid_gdf[['row', 'col']].iloc[7]
+    assert descriptor.cell(row, col).equals_exact(
+        grid_gdf.geometry.iloc[7], tolerance=1e-9)
+    # - Range of rows and columns
+    sub_gdf = descriptor.cells(2, 5, 1, 3)
+    assert sorted(sub_gdf['row'].unique()) == [2, 3, 4]
+    assert sorted(sub_gdf['col'].unique()) == [1, 2]
+    ref_gdf = grid_gdf.loc[sub_gdf.index]
+    assert all(sub_gdf.geometry.geom_equals_exact(ref_gdf.geometry,
+                                                  tolerance=1e-9))
+
+
+def test_descriptor_cells_in_bbox():
+    descriptor = generate_grid(track_gdf(), 3, 5000, 1000,
+                               return_descriptor=True)[1]
+    grid_gdf = descriptor.to_geodataframe()
+    bbox = (12.5, 36.8, 12.8, 37.1)
+    sel_gdf = descriptor.cells_in_bbox(*bbox)
+    ref_index = grid_gdf.index[grid_gdf.intersects(box(*bbox))]
+    assert len(sel_gdf) > 0
+    assert sorted(sel_gdf.index) == sorted(ref_index)
+    assert len(descriptor.cells_in_bbox(0., 0., 1., 1.)) == 0
+
+
+def test_descriptor_json(tmp_path):
+    descriptor = generate_grid(track_gdf(), 3, 5000, 1000,
+                               return_descriptor=True)[1]
+    out_file = tmp_path / 'grid.json'
+    descriptor.to_json(str(out_file))
+    dsc_json = GridDescriptor.from_json(str(out_file))
+    assert dsc_json.to_dict() == descriptor.to_dict()
+    assert dsc_json.cell(0, 0).equals(descriptor.cell(0, 0))
+
+
+def test_fishnet_descriptor():
+    geometry = Polygon([(0, 0), (1000, 200), (800, 1200), (-200, 1000)])
+    grid_gdf, descriptor = create_grid_within_polygon(
+        geometry, 3, 4, return_descriptor=True)
+    dsc_gdf = descriptor.to_geodataframe()
+    assert len(dsc_gdf) == len(grid_gdf) == 12
+    # - Same cells, possibly in a different order
+    c_ref = np.sort(np.round(grid_gdf.centroid.get_coordinates().values, 6),
+                    axis=0)
+    c_dsc = np.sort(np.round(dsc_gdf.centroid.get_coordinates().values, 6),
+                    axis=0)
+    np.testing.assert_allclose(c_dsc, c_ref)
+
+
+def test_iter_cells(tmp_path):
+    descriptor = generate_grid(track_gdf(), 3, 5000, 1000,
+                               return_descriptor=True)[1]
+    chunks = list(descriptor.iter_cells(chunk_size=10))
+    assert len(chunks) > 1
+    assert all(len(c) <= 9 for c in chunks)
+    grid_gdf = descriptor.to_geodataframe()
+    assert list(np.concatenate([c.index for c in chunks])) \
+        == list(grid_gdf.index)
+    # - Stream chunks to file
+    out_file = str(tmp_path / 'grid.shp')
+    n_cells = write_cell_chunks(descriptor.iter_cells(chunk_size=10),
+                                out_file)
+    out_gdf = gpd.read_file(out_file)
+    assert n_cells == len(out_gdf) == len(grid_gdf)
+    assert list(out_gdf['index']) == list(grid_gdf.index)
+    # - No cells: the output of the previous run is removed
+    assert write_cell_chunks(iter([grid_gdf.iloc[:0]]), out_file) == 0
+    assert not os.listdir(tmp_path)
+
+
+def test_iter_grid_within_polygon():
+    # - Non-rectangular footprint: the fishnet covers its bounding box
+    geometry = Polygon([(0, 0), (1000, 0), (1000, 200), (200, 1000),
+                        (0, 1000)])
+    grid_gdf = create_grid_within_polygon(geometry, 20, 20)
+    chunks = list(iter_grid_within_polygon(geometry, 20, 20,
+                                           chunk_size=50))
+    assert len(chunks) > 1
+    cells = gpd.GeoDataFrame(np.concatenate([c.geometry for c in chunks]),
+                             columns=['geometry'])
+    assert len(cells) < len(grid_gdf)
+    assert cells.intersection(geometry).area.gt(0).all()
+    ref = grid_gdf.intersection(geometry).area.gt(1e-6).sum()
+    assert len(cells) == ref
+    # - Clipped cells cover exactly the footprint
+    chunks = iter_grid_within_polygon(geometry, 20, 20, chunk_size=50,
+                                      clip=True)
+    area = sum(c.area.sum() for c in chunks)
+    assert np.isclose(area, geometry.area)
+
+
+def test_refine():
+    descriptor = generate_grid(track_gdf(), 3, 5000, 1000,
+                               return_descriptor=True)[1]
+    fine = descriptor.refine(2)
+    assert fine.shape == (2 * descriptor.n_rows, 6)
+    # - Coarse cells are the union of the fine cells
+    coarse_gdf = descriptor.refine(1, densify=2).cells(3, 5)
+    fine_gdf = fine.cells(6, 10)
+    for (row, col), cell in zip(coarse_gdf[['row', 'col']].values,
+                                coarse_gdf.geometry):
+        sub = fine_gdf[(fine_gdf['row'] // 2 == row)
+                       & (fine_gdf['col'] // 2 == col)]
+        assert len(sub) == 4
+        assert np.isclose(sub.union_all().symmetric_difference(cell).area,
+                          0, atol=1e-12)
+    assert descriptor.refine(1).to_dict() == descriptor.to_dict()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+""" Unit tests for the grid_rollup module. """
+import os
+import numpy as np
+import pytest
+import geopandas as gpd
+from grid_rollup import (check_levels, grid_levels, rollup_levels,
+                         rollup_geometry)
+from mapitaly_pipeline import (mapitaly_descriptors, grids_geodataframe,
+                               assign_ps_grids, run_pipeline)
+
+PS_FILE = os.path.join('.', 'data', 'shapefiles',
+                       'csk_ps_sample_Nocera_Terinese_A_epsg4326.shp')
+
+
+def test_check_levels():
+    assert check_levels([4, 1, 2, 2]) == [1, 2, 4]
+    with pytest.raises(ValueError):
+        check_levels([2, 3])
+    with pytest.raises(ValueError):
+        check_levels([0, 1])
+
+
+def test_rollup_levels(frames_file):
+    descriptors = mapitaly_descriptors(frames_file, n_c=3, az_res=5e3,
+                                       buffer_dist=1e3)
+    gdf_ps = gpd.read_file(PS_FILE)
+    levels = {g: grid_levels(d, [1, 2, 4]) for g, d in descriptors.items()}
+    fine_dsc = {g: d[4] for g, d in levels.items()}
+    gdf_fine = assign_ps_grids(gdf_ps, grids_geodataframe(fine_dsc))
+    gdf_fine['value'] = gdf_fine['id'].astype(float)
+    stats = rollup_levels(gdf_fine, [1, 2, 4], columns=['value'])
+    assert set(stats) == {1, 2, 4}
+    # - Roll-up of the finest level matches a Spatial Join
+    # - at the base level
+    gdf_base = assign_ps_grids(gdf_ps, grids_geodataframe(
+        {g: d[1] for g, d in levels.items()}))
+    ref = gdf_base.groupby(['grid_name', 'row', 'col']).size()
+    df_1 = stats[1].set_index(['grid_name', 'row', 'col'])
+    assert df_1['n_ps'].sum() == len(gdf_fine)
+    assert (df_1['n_ps'] == ref.reindex(df_1.index)).all()
+    assert np.isclose(df_1['value'].mul(df_1['n_ps']).sum(),
+                      gdf_fine['value'].sum())
+    # - Cell polygons of an intermediate level
+    gdf_2 = rollup_geometry(stats[2], {g: d[2] for g, d in levels.items()})
+    assert gdf_2.crs == gdf_ps.crs
+    assert gdf_2.geometry.is_valid.all()
+
+
+def test_run_pipeline_levels(frames_file, tmp_path):
+    out_dir = tmp_path / 'out'
+    run_pipeline(frames_file, [PS_FILE], out_dir=str(out_dir),
+                 levels=[1, 2], save_grids=True)
+    base = 'csk_ps_sample_Nocera_Terinese_A_epsg4326'
+    for f_name in [f'{base}_rc.parquet', f'{base}_rc_L1.parquet',
+                   f'{base}_rc_L2.parquet', 'grid_CSG2_151_STR-007_ASC.shp',
+                   'grid_CSG2_151_STR-007_ASC_L2.shp']:
+        assert os.path.isfile(out_dir / f_name)
+    gdf_1 = gpd.read_parquet(out_dir / f'{base}_rc_L1.parquet')
+    gdf_2 = gpd.read_parquet(out_dir / f'{base}_rc_L2.parquet')
+    assert gdf_1['n_ps'].sum() == gdf_2['n_ps'].sum()
+    assert len(gdf_1) <= len(gdf_2)
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+""" Unit tests for the iride_cli entry point. """
+import os
+import sys
+import subprocess
+import pytest
+from iride_cli import main
+
+
+def imported_modules(*cli_args) -> set:
+    """Return the top-level modules imported by a CLI invocation."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime',
+                           'iride_cli.py', *cli_args],
+                          capture_output=True, text=True, check=True)
+    modules = set()
+    for line in proc.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            name = line.split('|')[-1].strip()
+            modules.add(name.split('.')[0])
+    return modules
+
+
+def test_help_imports():
+    # - Top-level help does not import any of the tools
+    modules = imported_modules('--help')
+    assert 'geopandas' not in modules
+    assert 'mapitaly_at_grid' not in modules
+
+
+@pytest.mark.parametrize('command', ['grid', 'frame-grid', 'distribute',
+                                     'pipeline', 'batch', 'overlap'])
+def test_command_imports(command):
+    # - Plotting and Dask libraries are not imported at startup
+    modules = imported_modules(command, '--help')
+    assert not modules & {'matplotlib', 'cartopy', 'dask', 'dask_geopandas'}
+
+
+def test_distribute(tmp_path):
+    input_file \
+        = os.path.join('.', 'data', 'shapefiles',
+                       'csk_ps_sample_Nocera_Terinese_A_epsg4326.shp')
+    grid_file \
+        = os.path.join('.', 'data', 'shapefiles',
+                       'grid_CSG2_151_STR-007_ASC.shp')
+    main(['distribute', input_file, grid_file, '-O', str(tmp_path)])
+    assert os.path.isfile(
+        tmp_path / 'csk_ps_sample_Nocera_Terinese_A_epsg4326_rc.parquet')
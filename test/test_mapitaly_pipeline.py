@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+""" Unit tests for the mapitaly_pipeline module. """
+import os
+import geopandas as gpd
+from mapitaly_pipeline import mapitaly_grids, run_pipeline
+
+
+def test_mapitaly_grids(frames_file):
+    gdf_grids = mapitaly_grids(frames_file, n_c=3, az_res=5e3,
+                               buffer_dist=1e3)
+    assert isinstance(gdf_grids, gpd.GeoDataFrame)
+    assert set(gdf_grids['grid_name']) \
+        == {'grid_CSG2_151_STR-007_ASC', 'grid_CSG2_152_STR-007_DES'}
+    # - Subset of tracks
+    gdf_grids = mapitaly_grids(frames_file, tracks=['151'])
+    assert set(gdf_grids['grid_name']) == {'grid_CSG2_151_STR-007_ASC'}
+
+
+def test_run_pipeline(frames_file, tmp_path):
+    ps_file \
+        = os.path.join('.', 'data', 'shapefiles',
+                       'csk_ps_sample_Nocera_Terinese_A_epsg4326.shp')
+    out_dir = tmp_path / 'out'
+    ps_out = run_pipeline(frames_file, [ps_file], out_dir=str(out_dir))
+    gdf_smp = gpd.read_parquet(ps_out[ps_file])
+    assert {'id', 'grid_name', 'row', 'col'} <= set(gdf_smp.columns)
+    assert len(gdf_smp) > 0
+    # - Nothing written: results returned in memory
+    gdf_mem = run_pipeline(frames_file, [ps_file])[ps_file]
+    assert sorted(gdf_mem['id']) == sorted(gdf_smp['id'])
+    # - Only the PS output is written by default
+    assert sorted(os.listdir(out_dir)) \
+        == ['csk_ps_sample_Nocera_Terinese_A_epsg4326_rc.parquet']
+    # - Intermediate grids on request
+    run_pipeline(frames_file, [ps_file], out_dir=str(out_dir),
+                 save_grids=True)
+    assert os.path.isfile(out_dir / 'grid_CSG2_151_STR-007_ASC.shp')
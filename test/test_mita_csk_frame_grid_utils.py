@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+""" Unit tests for the grid alignment utilities. """
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from shapely.geometry import Polygon
+from mita_csk_frame_grid_utils import (create_grid_within_polygon,
+                                       grid_centroid, grid_gdf_shift,
+                                       align_grids,
+                                       grid_descriptor_within_polygon,
+                                       iter_grid_within_polygon)
+
+
+def frame_grid(x_off: float = 0.) -> gpd.GeoDataFrame:
+    geometry = Polygon([(x_off, 0), (x_off + 1000, 200),
+                        (x_off + 800, 1200), (x_off - 200, 1000)])
+    grid_gdf = create_grid_within_polygon(geometry, 3, 4)
+    grid_gdf['f_code'] = range(1, len(grid_gdf) + 1)
+    return grid_gdf
+
+
+def test_grid_centroid():
+    grid_gdf = frame_grid()
+    union = grid_gdf.union_all().centroid
+    np.testing.assert_allclose(grid_centroid(grid_gdf)[0],
+                               (union.x, union.y))
+
+
+def test_grid_gdf_shift():
+    grid_gdf = frame_grid()
+    shift_gdf = grid_gdf_shift(grid_gdf, (5000., -3000.))
+    np.testing.assert_allclose(grid_centroid(shift_gdf)[0], (5000., -3000.))
+    # - Attributes, index and CRS are preserved
+    assert list(shift_gdf.columns) == list(grid_gdf.columns)
+    assert list(shift_gdf['f_code']) == list(grid_gdf['f_code'])
+    assert shift_gdf.crs == grid_gdf.crs
+    np.testing.assert_allclose(shift_gdf.area, grid_gdf.area)
+    # - Input not modified
+    assert grid_gdf.geometry.equals(frame_grid().geometry)
+    # - Empty grid
+    empty_gdf = grid_gdf_shift(grid_gdf.iloc[:0], (5000., -3000.))
+    assert empty_gdf.empty
+    assert list(empty_gdf.columns) == list(grid_gdf.columns)
+    assert empty_gdf.crs == grid_gdf.crs
+
+
+def test_align_grids():
+    grids = []
+    for i, x_off in enumerate((0., 2000., 4000.)):
+        grid_gdf = frame_grid(x_off)
+        grid_gdf.insert(0, 'grid_name', f'g{i}')
+        grids.append(grid_gdf)
+    gdf_grids = gpd.GeoDataFrame(pd.concat(grids, ignore_index=True),
+                                 crs=grids[0].crs)
+    references = {'g0': (100., 100.), 'g2': (-500., 700.)}
+    aligned = align_grids(gdf_grids, references)
+    centroids = grid_centroid(aligned, by='grid_name')
+    np.testing.assert_allclose(centroids[0], references['g0'])
+    np.testing.assert_allclose(centroids[2], references['g2'])
+    # - Grid without reference is not moved
+    np.testing.assert_allclose(centroids[1],
+                               grid_centroid(gdf_grids, by='grid_name')[1])
+    # - Same result as shifting the grids one by one
+    for grid_name, ref in references.items():
+        sel = gdf_grids['grid_name'] == grid_name
+        ref_gdf = grid_gdf_shift(gdf_grids[sel], ref)
+        assert all(aligned[sel].geometry.geom_equals_exact(
+            ref_gdf.geometry, tolerance=1e-6))
+
+
+def test_iter_grid_with_descriptor(monkeypatch):
+    geometry = Polygon([(0, 0), (1000, 200), (800, 1200), (-200, 1000)])
+    descriptor = grid_descriptor_within_polygon(geometry, 3, 4)
+    ref = pd.concat(iter_grid_within_polygon(geometry, 3, 4))
+    # - The descriptor is not computed again
+    monkeypatch.setattr(
+        'mita_csk_frame_grid_utils.grid_descriptor_within_polygon', None)
+    cells = pd.concat(iter_grid_within_polygon(geometry, 3, 4,
+                                               descriptor=descriptor))
+    assert cells.geometry.geom_equals_exact(ref.geometry, 1e-9).all()
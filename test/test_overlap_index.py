@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+""" Unit tests for the overlap_index module. """
+import numpy as np
+import pytest
+from mapitaly_pipeline import mapitaly_grids
+from overlap_index import OverlapIndex
+
+ASC = 'grid_CSG2_151_STR-007_ASC'
+DES = 'grid_CSG2_152_STR-007_DES'
+
+
+def test_overlap_index(frames_file, tmp_path):
+    gdf_grids = mapitaly_grids(frames_file, n_c=3, az_res=5e3,
+                               buffer_dist=1e3)
+    index = OverlapIndex.from_grids(gdf_grids)
+    assert len(index) == len(gdf_grids)
+    assert index.matrix.nnz > 0
+    # - Only cells of different grids are paired
+    m_coo = index.matrix.tocoo()
+    assert (index.grid_code[m_coo.row] != index.grid_code[m_coo.col]).all()
+    assert ((m_coo.data > 0) & (m_coo.data <= 1 + 1e-9)).all()
+
+    # - Partners of a cell match a brute-force intersection
+    gdf_utm = gdf_grids.to_crs(gdf_grids.estimate_utm_crs())
+    cell = gdf_utm[gdf_utm['grid_name'] == ASC].iloc[len(gdf_utm) // 4]
+    partners = index.partners(ASC, cell['row'], cell['col'])
+    gdf_des = gdf_utm[gdf_utm['grid_name'] == DES]
+    area = gdf_des.intersection(cell.geometry).area
+    ref = gdf_des[area > 0]
+    assert len(partners) == len(ref) > 0
+    assert set(partners['grid_name']) == {DES}
+    assert sorted(zip(partners['row'], partners['col'])) \
+        == sorted(zip(ref['row'], ref['col']))
+    assert np.isclose(partners['fraction'].sum(),
+                      area.sum() / cell.geometry.area)
+
+    # - Pairs between two grids
+    df_pairs = index.pairs(ASC, DES)
+    assert len(df_pairs) == (index.grid_code[m_coo.row]
+                             == index.grid_names.index(ASC)).sum()
+    assert (df_pairs[['fraction_a', 'fraction_b']] > 0).all().all()
+    df_o = index.grid_overlaps()
+    assert set(zip(df_o['grid_a'], df_o['grid_b'])) \
+        == {(ASC, DES), (DES, ASC)}
+
+    # - Save/Load
+    out_file = str(tmp_path / 'overlap_index.npz')
+    index.save(out_file)
+    index_l = OverlapIndex.load(out_file)
+    assert index_l.grid_names == index.grid_names
+    assert (index_l.matrix != index.matrix).nnz == 0
+    assert index_l.partners(ASC, cell['row'], cell['col']) \
+        .equals(partners)
+    with pytest.raises(KeyError):
+        index_l.partners(ASC, -1, 0)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+""" Unit tests for the ps_cube module. """
+import os
+import numpy as np
+import pytest
+import geopandas as gpd
+from iride_cli import main
+from ps_cube import date_columns, write_ps_cube, PSCube
+
+DATES = ['D20200110', 'D20200203', 'D20200227', 'D20200322', 'D20200415']
+
+
+def sample_ps(n_pts: int = 500, seed: int = 0) -> gpd.GeoDataFrame:
+    rng = np.random.default_rng(seed)
+    gdf = gpd.GeoDataFrame(
+        {'id': np.arange(n_pts),
+         'grid_name': rng.choice(['grid_A', 'grid_B'], n_pts),
+         'row': rng.integers(0, 6, n_pts), 'col': rng.integers(0, 3, n_pts)},
+        geometry=gpd.points_from_xy(rng.uniform(15, 16, n_pts),
+                                    rng.uniform(38, 39, n_pts)),
+        crs='EPSG:4326')
+    # - Linear displacement with a velocity proportional to the id
+    t_yr = (np.array([f"{d[1:5]}-{d[5:7]}-{d[7:]}" for d in DATES],
+                     dtype='datetime64[D]') - np.datetime64('2020-01-10')) \
+        .astype(float) / 365.25
+    for d, t in zip(DATES, t_yr):
+        gdf[d] = gdf['id'] * 0.1 * t
+    gdf.loc[3, DATES[2]] = np.nan
+    # - Displacement columns in random order
+    return gdf[['id', 'grid_name', 'row', 'col', 'geometry']
+               + DATES[::-1]]
+
+
+def test_date_columns():
+    cols, dates = date_columns(['id', 'D20200203', 'row', '20200110'])
+    assert cols == ['20200110', 'D20200203']
+    assert dates[0] == np.datetime64('2020-01-10')
+
+
+def test_ps_cube(tmp_path):
+    gdf = sample_ps()
+    cube_dir = str(tmp_path / 'ps_rc_cube')
+    cube = write_ps_cube(gdf, cube_dir, cells_per_chunk=5)
+    assert cube.n_points == len(gdf)
+    assert cube.n_chunks == int(np.ceil(len(cube.cells) / 5))
+    assert cube.columns == DATES
+    # - Per-cell read
+    df_pts, series = cube.read_cell('grid_B', 2, 1)
+    ref = gdf[(gdf['grid_name'] == 'grid_B') & (gdf['row'] == 2)
+              & (gdf['col'] == 1)]
+    assert series.dtype == np.float32
+    assert sorted(df_pts['id']) == sorted(ref['id'])
+    np.testing.assert_allclose(
+        series, ref.set_index('id').loc[df_pts['id'], DATES].to_numpy(),
+        rtol=1e-6)
+    start, stop = cube.cell_range('grid_B', 2, 1)
+    assert stop - start == len(ref)
+    # - Per-cell mean series
+    ref_mean = gdf.groupby(['grid_name', 'row', 'col'])[DATES].mean()
+    means = cube.cell_means()
+    np.testing.assert_allclose(
+        means, ref_mean.loc[list(cube.cells[['grid_name', 'row', 'col']]
+                                 .itertuples(index=False, name=None))]
+        .to_numpy(), rtol=1e-5)
+    # - Velocity
+    velocity = cube.velocity(series)
+    np.testing.assert_allclose(velocity, df_pts['id'] * 0.1, rtol=1e-4,
+                               atol=1e-4)
+    cube.close()
+    with PSCube(cube_dir) as cube_r:
+        assert len(cube_r.cells) == len(cube.cells)
+    # - Existing cube replaced, other directories and files refused
+    write_ps_cube(gdf.iloc[:10], cube_dir).close()
+    with PSCube(cube_dir) as cube_r:
+        assert cube_r.n_points == 10
+    other = tmp_path / 'other'
+    other.mkdir()
+    (other / 'data.txt').write_text('keep')
+    for path in (other, other / 'data.txt'):
+        with pytest.raises(FileExistsError):
+            write_ps_cube(gdf, str(path))
+    assert (other / 'data.txt').read_text() == 'keep'
+
+
+def test_distribute_cube(tmp_path):
+    ps_file = os.path.join('.', 'data', 'shapefiles',
+                           'csk_ps_sample_Nocera_Terinese_A_epsg4326.shp')
+    grid_file = os.path.join('.', 'data', 'shapefiles',
+                             'grid_CSG2_151_STR-007_ASC.shp')
+    gdf = gpd.read_file(ps_file)
+    for i, d in enumerate(DATES):
+        gdf[d] = float(i)
+    # - Input other than a shapefile: the cube is named after the input
+    in_file = str(tmp_path / 'ps_sample.gpkg')
+    gdf.to_file(in_file)
+    main(['distribute', in_file, grid_file, '-O', str(tmp_path),
+          '-F', 'cube'])
+    assert os.path.isfile(in_file)
+    with PSCube(str(tmp_path / 'ps_sample_rc_cube')) as cube:
+        assert cube.n_points > 0
+        assert set(cube.cells['grid_name']) \
+            == {'grid_CSG2_151_STR-007_ASC'}
+        np.testing.assert_allclose(cube.cell_means()[0], np.arange(5))
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+""" Unit tests for the read_cached module. """
+import os
+import geopandas as gpd
+from read_cached import (read_cached, cached_parquet, cache_name,
+                         default_cache_dir)
+
+
+def test_read_cached(tmp_path):
+    # - import sample data
+    input_file \
+        = os.path.join('.', 'data', 'shapefiles',
+                       'grid_CSG2_151_STR-007_ASC.shp')
+    cache_dir = str(tmp_path / 'cache')
+    gdf_ref = gpd.read_file(input_file)
+    gdf = read_cached(input_file, cache_dir=cache_dir)
+    assert os.path.isfile(os.path.join(cache_dir,
+                                       cache_name(input_file) + '.parquet'))
+    assert cache_name(input_file).startswith('grid_CSG2_151_STR-007_ASC.shp')
+    assert gdf.equals(gdf_ref)
+    # - Column projection
+    gdf = read_cached(input_file, columns=['row'], cache_dir=cache_dir)
+    assert list(gdf.columns) == ['row', 'geometry']
+
+
+def test_read_cached_zip(tmp_path):
+    input_file \
+        = os.path.join('.', 'data', 'shapefiles',
+                       'csk_frame_map_italy_epsg4326.zip')
+    gdf = read_cached(input_file, cache_dir=str(tmp_path))
+    assert len(gdf) == len(gpd.read_file(input_file))
+
+
+def test_cache_invalidation(tmp_path):
+    # - Source file modified after the cache has been created
+    src_file = str(tmp_path / 'grid.shp')
+    gdf_ref = gpd.read_file(os.path.join('.', 'data', 'shapefiles',
+                                         'grid_CSG2_151_STR-007_ASC.shp'))
+    gdf_ref.to_file(src_file)
+    cache_file = cached_parquet(src_file)
+    mtime = os.stat(cache_file).st_mtime_ns
+    # - Unchanged source: the cache is reused
+    assert cached_parquet(src_file) == cache_file
+    assert os.stat(cache_file).st_mtime_ns == mtime
+    gdf_ref.iloc[:10].to_file(src_file)
+    assert len(read_cached(src_file)) == 10
+
+
+def test_shared_cache_dir(tmp_path):
+    # - Sources with the same file name sharing the cache directory
+    gdf_ref = gpd.read_file(os.path.join('.', 'data', 'shapefiles',
+                                         'grid_CSG2_151_STR-007_ASC.shp'))
+    cache_dir = str(tmp_path / 'cache')
+    src_files = []
+    for i, sub in enumerate(('a', 'b')):
+        os.makedirs(tmp_path / sub)
+        src_file = str(tmp_path / sub / 'grid.shp')
+        gdf_i = gdf_ref.iloc[:10].copy()
+        gdf_i['row'] += 1000 * i
+        gdf_i.to_file(src_file)
+        src_files.append(src_file)
+    # - Same size and modification time
+    mtime = os.stat(src_files[0]).st_mtime_ns
+    for src_file in src_files:
+        for sfx in ('.shp', '.shx', '.dbf'):
+            os.utime(src_file.replace('.shp', sfx), ns=(mtime, mtime))
+    row_min = gdf_ref['row'].iloc[:10].min()
+    for _ in range(2):
+        for i, src_file in enumerate(src_files):
+            gdf = read_cached(src_file, cache_dir=cache_dir)
+            assert gdf['row'].min() == row_min + 1000 * i
+
+
+def test_default_cache_dir(monkeypatch, tmp_path):
+    monkeypatch.delenv('IRIDE_CACHE_DIR')
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+    assert default_cache_dir() == str(tmp_path / 'iride')